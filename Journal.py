@@ -1,122 +1,18 @@
+import functools
 import sys
-import sqlite3
-import time
-import pygame
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QPushButton, QLabel, QMessageBox,
-    QInputDialog, QWidget, QDialog, QListWidget, QListWidgetItem, QTextEdit
+    QInputDialog, QWidget, QDialog, QListWidget, QListWidgetItem, QTextEdit, QLineEdit, QHBoxLayout
 )
 from PyQt5.QtCore import Qt, QSize  # Added QSize import
 from PyQt5.QtGui import QFont
 
-
-class Journal:
-    DB_FILE = 'journal.db'
-
-    def __init__(self):
-        self.conn = self.create_connection()
-        self.create_table()
-
-    def create_connection(self):
-        """Create a database connection."""
-        try:
-            return sqlite3.connect(Journal.DB_FILE)
-        except sqlite3.Error as e:
-            print(f"Error connecting to database: {e}")
-        return None
-
-    def create_table(self):
-        """Create the journal_entries table if it doesn't exist."""
-        try:
-            with self.conn:
-                self.conn.execute('''
-                    CREATE TABLE IF NOT EXISTS journal_entries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        number INTEGER,
-                        title TEXT,
-                        content TEXT,
-                        date TEXT
-                    )
-                ''')
-        except sqlite3.Error as e:
-            print(f"Error creating table: {e}")
-
-    def add_new_entry(self, title, content):
-        """Add a new journal entry."""
-        entry_date = time.strftime("%d-%m-%Y", time.localtime())
-        entry_number = self.get_next_entry_number()
-
-        if entry_number:
-            try:
-                with self.conn:
-                    self.conn.execute('''
-                        INSERT INTO journal_entries (number, title, content, date)
-                        VALUES (?, ?, ?, ?)
-                    ''', (entry_number, title, content, entry_date))
-                return f"Entry #{entry_number} added successfully."
-            except sqlite3.Error as e:
-                return f"Error saving entry to the database: {e}"
-        else:
-            return "Failed to determine next entry number."
-
-    def get_next_entry_number(self):
-        """Get the next available entry number from the database."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT MAX(number) FROM journal_entries')
-            result = cursor.fetchone()
-            return (result[0] or 0) + 1
-        except sqlite3.Error as e:
-            print(f"Error retrieving entry count: {e}")
-            return None
-
-    def get_all_entries(self):
-        """Get all journal entries."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM journal_entries ORDER BY number')  # Order by number
-            rows = cursor.fetchall()
-            return rows
-        except sqlite3.Error as e:
-            return []
-
-    def edit_entry(self, entry_number, new_title=None, new_content=None):
-        """Edit the title or content of an existing entry."""
-        try:
-            with self.conn:
-                self.conn.execute('''
-                    UPDATE journal_entries
-                    SET title = ?, content = ?
-                    WHERE number = ?
-                ''', (new_title, new_content, entry_number))
-            return f"Entry #{entry_number} updated successfully."
-        except sqlite3.Error as e:
-            return f"Error updating entry: {e}"
-
-    def delete_entry(self, entry_number):
-        """Delete an entry by its number."""
-        try:
-            with self.conn:
-                self.conn.execute('DELETE FROM journal_entries WHERE number = ?', (entry_number,))
-            self.renumber_entries()  # Renumber entries after deletion
-            return f"Entry #{entry_number} deleted successfully."
-        except sqlite3.Error as e:
-            return f"Error deleting entry: {e}"
-
-    def renumber_entries(self):
-        """Renumber the entries after a deletion."""
-        try:
-            entries = self.get_all_entries()
-            for index, entry in enumerate(entries):
-                new_number = index + 1
-                with self.conn:
-                    self.conn.execute('''
-                        UPDATE journal_entries
-                        SET number = ?
-                        WHERE id = ?
-                    ''', (new_number, entry[0]))  # entry[0] is the id
-        except sqlite3.Error as e:
-            print(f"Error renumbering entries: {e}")
+from yournal import instrumentation, router
+from yournal.diagnostics import DiagnosticsDialog
+from yournal.journal import Journal
+from yournal.music import MusicPlayer
+from yournal.transfer_dialog import TransferProgress
+from yournal.worker import DatabaseWorker
 
 
 class JournalApp(QMainWindow):
@@ -125,13 +21,12 @@ class JournalApp(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        self.journal = Journal()
+        user = router.bound_user()  # This window's, even if someone else logs in meanwhile
+        self.journal = Journal(user)  # Reads for the entry dialogs
+        self.worker = DatabaseWorker(functools.partial(Journal, user), self)  # Writes, off the GUI thread
+        self.worker.start()
 
-        # Initialize pygame for playing music
-        pygame.mixer.init()
-        pygame.mixer.music.load("/Users/pedritos22/Desktop/relaxing_music.mp3")  # Load your relaxing music file here
-        pygame.mixer.music.set_volume(0.5)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Play the music indefinitely
+        self.music = MusicPlayer()  # Relaxing music from music.txt, started once the window is shown
 
         # Set window title and dimensions
         self.setWindowTitle("Journal Manager")
@@ -185,6 +80,22 @@ class JournalApp(QMainWindow):
         self.delete_entry_btn.clicked.connect(self.select_entry_for_deletion)
         self.main_layout.addWidget(self.delete_entry_btn)
 
+        # Import and Export Buttons, JSON lines, CSV or a folder of Markdown files
+        self.transfer_layout = QHBoxLayout()
+        self.import_btn = QPushButton("Import Entries", self)
+        self.import_btn.clicked.connect(lambda: TransferProgress(self.worker, 'import_entries', "entries", self))
+        self.transfer_layout.addWidget(self.import_btn)
+        self.export_btn = QPushButton("Export Entries", self)
+        self.export_btn.clicked.connect(lambda: TransferProgress(self.worker, 'export_entries', "entries", self))
+        self.transfer_layout.addWidget(self.export_btn)
+        self.main_layout.addLayout(self.transfer_layout)
+
+        # Diagnostics Button, only while instrumentation is recording
+        if instrumentation.enabled:
+            self.diagnostics_btn = QPushButton("Diagnostics", self)
+            self.diagnostics_btn.clicked.connect(self.show_diagnostics)
+            self.main_layout.addWidget(self.diagnostics_btn)
+
         # Footer Label
         self.footer_label = QLabel("Yournal™", self)
         self.footer_label.setAlignment(Qt.AlignCenter)
@@ -226,8 +137,10 @@ class JournalApp(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Title and content cannot be empty.")
             return
 
-        result = self.journal.add_new_entry(title, content)
-        QMessageBox.information(self, "Entry Added", result)
+        self.worker.write(
+            'add_new_entry', title, content,
+            callback=lambda result: QMessageBox.information(self, "Entry Added", result)
+        )
         dialog.close()
 
     def show_entries(self):
@@ -238,20 +151,17 @@ class JournalApp(QMainWindow):
 
         layout = QVBoxLayout(entries_window)
 
+        # Search box, filters the entries as the user types
+        search_box = QLineEdit(entries_window)
+        search_box.setPlaceholderText("Search entries...")
+        layout.addWidget(search_box)
+
         # List widget to display the entries
         entries_list = QListWidget(entries_window)
         layout.addWidget(entries_list)
 
-        # Fetching all entries
-        entries = self.journal.get_all_entries()
-
-        if not entries:
-            entries_list.addItem("No entries found.")
-        else:
-            for entry in entries:
-                entry_text = f"Entry #{entry[1]}: {entry[2]} - {entry[3]} on {entry[4]}"
-                item = QListWidgetItem(entry_text)
-                entries_list.addItem(item)
+        search_box.textChanged.connect(lambda text: self.fill_entries_list(entries_list, text))
+        self.fill_entries_list(entries_list, "")
 
         # Button to close the entries window
         close_button = QPushButton("Close", entries_window)
@@ -261,9 +171,31 @@ class JournalApp(QMainWindow):
         entries_window.setLayout(layout)
         entries_window.exec_()  # Show the entries dialog
 
+    def fill_entries_list(self, entries_list, search_text):
+        """Fill the list with the entries matching the search text, or all entries."""
+        entries_list.clear()
+        if search_text.strip():
+            entries = self.journal.search(search_text)
+            if not entries:
+                entries_list.addItem("No matching entries.")
+            for entry_id, entry_number, title, snippet in entries:
+                entries_list.addItem(QListWidgetItem(f"Entry #{entry_number}: {title} - {snippet}"))
+            return
+
+        # Fetching all entries, with a short preview instead of the full content
+        entries = self.journal.get_all_entries(Journal.LIST_COLUMNS)
+
+        if not entries:
+            entries_list.addItem("No entries found.")
+        else:
+            for entry in entries:
+                entry_text = f"Entry #{entry[1]}: {entry[2]} - {entry[5]} on {entry[4]}"
+                item = QListWidgetItem(entry_text)
+                entries_list.addItem(item)
+
     def select_entry_for_edit(self):
         """Show a dialog to select an entry for editing."""
-        entries = self.journal.get_all_entries()
+        entries = self.journal.get_all_entries(Journal.LIST_COLUMNS)
         if not entries:
             QMessageBox.warning(self, "No Entries", "No entries found to edit.")
             return
@@ -279,21 +211,23 @@ class JournalApp(QMainWindow):
         for entry in entries:
             entry_text = f"Entry #{entry[1]}: {entry[2]}"
             item = QListWidgetItem(entry_text)
+            item.setData(Qt.UserRole, entry[0])  # Selections are resolved by id
             entries_list.addItem(item)
         layout.addWidget(entries_list)
 
         # Button to edit the selected entry
         edit_button = QPushButton("Edit Selected Entry")
-        edit_button.clicked.connect(lambda: self.edit_entry(entries_list.currentRow(), entry_selector))
+        edit_button.clicked.connect(lambda: self.edit_entry(entries_list.currentItem(), entry_selector))
         layout.addWidget(edit_button)
 
         entry_selector.setLayout(layout)
         entry_selector.exec_()
 
-    def edit_entry(self, index, dialog):
+    def edit_entry(self, item, dialog):
         """Edit the selected entry."""
-        entries = self.journal.get_all_entries()
-        selected_entry = entries[index]
+        selected_entry = self.selected_entry(item)
+        if not selected_entry:
+            return
         entry_number = selected_entry[1]
 
         edit_dialog = QDialog(self)
@@ -332,13 +266,15 @@ class JournalApp(QMainWindow):
             QMessageBox.warning(self, "Input Error", "Title and content cannot be empty.")
             return
 
-        result = self.journal.edit_entry(entry_number, new_title, new_content)
-        QMessageBox.information(self, "Entry Edited", result)
+        self.worker.write(
+            'edit_entry', entry_number, new_title, new_content,
+            callback=lambda result: QMessageBox.information(self, "Entry Edited", result)
+        )
         dialog.close()
 
     def select_entry_for_deletion(self):
         """Show a dialog to select an entry for deletion."""
-        entries = self.journal.get_all_entries()
+        entries = self.journal.get_all_entries(Journal.LIST_COLUMNS)
         if not entries:
             QMessageBox.warning(self, "No Entries", "No entries found to delete.")
             return
@@ -354,27 +290,51 @@ class JournalApp(QMainWindow):
         for entry in entries:
             entry_text = f"Entry #{entry[1]}: {entry[2]}"
             item = QListWidgetItem(entry_text)
+            item.setData(Qt.UserRole, entry[0])  # Selections are resolved by id
             entries_list.addItem(item)
         layout.addWidget(entries_list)
 
         # Button to delete the selected entry
         delete_button = QPushButton("Delete Selected Entry")
-        delete_button.clicked.connect(lambda: self.delete_entry(entries_list.currentRow(), entry_selector))
+        delete_button.clicked.connect(lambda: self.delete_entry(entries_list.currentItem(), entry_selector))
         layout.addWidget(delete_button)
 
         entry_selector.setLayout(layout)
         entry_selector.exec_()
 
-    def delete_entry(self, index, dialog):
+    def delete_entry(self, item, dialog):
         """Delete the selected entry."""
-        entries = self.journal.get_all_entries()
-        selected_entry = entries[index]
+        selected_entry = self.selected_entry(item)
+        if not selected_entry:
+            return
         entry_number = selected_entry[1]
 
-        result = self.journal.delete_entry(entry_number)
-        QMessageBox.information(self, "Entry Deletion", result)
+        self.worker.write(
+            'delete_entry', entry_number,
+            callback=lambda result: QMessageBox.information(self, "Entry Deletion", result)
+        )
         dialog.close()
 
+    def selected_entry(self, item):
+        """Look up the entry behind a selection list item by its id."""
+        entry = item and self.journal.get_entry(item.data(Qt.UserRole))
+        if not entry:
+            QMessageBox.warning(self, "No Entry Selected", "Select an entry first.")
+        return entry
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.music.start()
+
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec_()
+
+    def closeEvent(self, event):
+        self.music.stop()
+        self.worker.write('renumber_entries')  # Close the numbering gaps left by deletions
+        self.worker.stop()
+        event.accept()
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,132 +1,150 @@
+import functools
 import sys
-import sqlite3
-import time
-import pygame
+import bisect
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QPushButton, QLabel, QMessageBox,
-    QInputDialog, QWidget, QDialog, QListWidget, QListWidgetItem, QTextEdit, QComboBox
+    QInputDialog, QWidget, QDialog, QListView, QListWidget, QListWidgetItem, QTextEdit, QComboBox,
+    QLineEdit, QHBoxLayout
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QTimer
 from PyQt5.QtGui import QFont
 
+from yournal import instrumentation, router
+from yournal.diagnostics import DiagnosticsDialog
+from yournal.journal import Journal
+from yournal.music import MusicPlayer
+from yournal.transfer_dialog import TransferProgress
+from yournal.worker import DatabaseWorker
 
-class Journal:
-    DB_FILE = 'journal.db'
 
-    def __init__(self):
-        self.conn = self.create_connection()
-        self.create_table()
-
-    def create_connection(self):
-        """Create a database connection."""
-        try:
-            return sqlite3.connect(Journal.DB_FILE)
-        except sqlite3.Error as e:
-            print(f"Error connecting to database: {e}")
-        return None
+class JournalEntryModel(QAbstractListModel):
+    """List model over the journal that loads entries page by page as the view scrolls."""
+    BATCH_SIZE = 100
 
-    def create_table(self):
-        """Create the journal_entries table if it doesn't exist."""
-        try:
-            with self.conn:
-                self.conn.execute('''
-                    CREATE TABLE IF NOT EXISTS journal_entries (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        number INTEGER,
-                        title TEXT,
-                        content TEXT,
-                        mood TEXT,
-                        date TEXT
-                    )
-                ''')
-        except sqlite3.Error as e:
-            print(f"Error creating table: {e}")
-
-    def add_new_entry(self, title, content, mood):
-        """Add a new journal entry."""
-        entry_date = time.strftime("%d-%m-%Y", time.localtime())
-        entry_number = self.get_next_entry_number()
-
-        if entry_number:
-            try:
-                with self.conn:
-                    self.conn.execute('''
-                        INSERT INTO journal_entries (number, title, content, mood, date)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (entry_number, title, content, mood, entry_date))
-                return f"Entry #{entry_number} added successfully."
-            except sqlite3.Error as e:
-                return f"Error saving entry to the database: {e}"
-        else:
-            return "Failed to determine next entry number."
-
-    def get_next_entry_number(self):
-        """Get the next available entry number from the database."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT MAX(number) FROM journal_entries')
-            result = cursor.fetchone()
-            return (result[0] or 0) + 1
-        except sqlite3.Error as e:
-            print(f"Error retrieving entry count: {e}")
-            return None
+    def __init__(self, journal, parent=None):
+        super().__init__(parent)
+        self.journal = journal
+        self.entries = []  # Loaded rows, in entry number order
+        self.exhausted = False  # True once every entry has been fetched
 
-    def get_all_entries(self):
-        """Get all journal entries."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM journal_entries ORDER BY number')
-            rows = cursor.fetchall()
-            return rows
-        except sqlite3.Error as e:
-            return []
-
-    def get_entry_by_number(self, entry_number):
-        """Get a specific journal entry by its number."""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM journal_entries WHERE number = ?', (entry_number,))
-            return cursor.fetchone()
-        except sqlite3.Error as e:
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
             return None
+        entry = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            return f"Entry #{entry[1]}: {entry[2]} - Mood: {entry[3]} (Date: {entry[4]})"
+        if role == Qt.ToolTipRole:
+            return entry[5]  # Start of the content
+        if role == Qt.UserRole:
+            return entry  # The list columns; the details dialog loads the full entry
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = self.journal.get_entries_page(self.last_number(), JournalEntryModel.BATCH_SIZE, Journal.LIST_COLUMNS)
+        self.exhausted = len(page) < JournalEntryModel.BATCH_SIZE
+        self.append_rows(page)
+
+    def reload(self):
+        """Drop every loaded row; the view fetches the first page again."""
+        self.beginResetModel()
+        self.entries = []
+        self.exhausted = False
+        self.endResetModel()
+
+    def load_new_entries(self):
+        """Append entries added after the last loaded one, once the list is fully loaded."""
+        if self.exhausted:  # Otherwise they arrive with a later fetchMore
+            self.append_rows(
+                self.journal.get_entries_page(self.last_number(), JournalEntryModel.BATCH_SIZE, Journal.LIST_COLUMNS)
+            )
+
+    def entry_changed(self, entry_number):
+        """Reload one edited entry and repaint only its row."""
+        row = self.row_of(entry_number)
+        entry = self.journal.get_entry_by_number(entry_number, Journal.LIST_COLUMNS)
+        if row is None or entry is None:
+            return
+        self.entries[row] = entry
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def entry_removed(self, entry_number):
+        """Remove the row of a deleted entry."""
+        row = self.row_of(entry_number)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.entries[row]
+        self.endRemoveRows()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.entries)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.entries.extend(rows)
+        self.endInsertRows()
+
+    def last_number(self):
+        return self.entries[-1][1] if self.entries else 0
+
+    def row_of(self, entry_number):
+        """Find the row of a loaded entry by binary search on its number."""
+        row = bisect.bisect_left(self.entries, entry_number, key=lambda entry: entry[1])
+        if row < len(self.entries) and self.entries[row][1] == entry_number:
+            return row
+        return None
 
-    def edit_entry(self, entry_number, new_title=None, new_content=None, new_mood=None):
-        """Edit the title, content, or mood of an existing entry."""
-        try:
-            with self.conn:
-                self.conn.execute('''
-                    UPDATE journal_entries
-                    SET title = ?, content = ?, mood = ?
-                    WHERE number = ?
-                ''', (new_title, new_content, new_mood, entry_number))
-            return f"Entry #{entry_number} updated successfully."
-        except sqlite3.Error as e:
-            return f"Error updating entry: {e}"
-
-    def delete_entry(self, entry_number):
-        """Delete an entry by its number."""
-        try:
-            with self.conn:
-                self.conn.execute('DELETE FROM journal_entries WHERE number = ?', (entry_number,))
-            self.renumber_entries()  # Renumber entries after deletion
-            return f"Entry #{entry_number} deleted successfully."
-        except sqlite3.Error as e:
-            return f"Error deleting entry: {e}"
-
-    def renumber_entries(self):
-        """Renumber the entries after a deletion."""
-        try:
-            entries = self.get_all_entries()
-            for index, entry in enumerate(entries):
-                new_number = index + 1
-                with self.conn:
-                    self.conn.execute('''
-                        UPDATE journal_entries
-                        SET number = ?
-                        WHERE id = ?
-                    ''', (new_number, entry[0]))  # entry[0] is the id
-        except sqlite3.Error as e:
-            print(f"Error renumbering entries: {e}")
+
+class DraftAutosaver(QObject):
+    """Saves an editor dialog's text as a draft once the user pauses typing.
+
+    Every edit restarts a short timer, so a burst of keystrokes costs one write; the
+    write goes through the database worker and is skipped when nothing changed.
+    """
+    DELAY_MS = 400
+
+    def __init__(self, worker, key, read_fields, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.key = key
+        self.read_fields = read_fields  # Returns the (title, content, mood) being edited
+        self.last_saved = read_fields()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DraftAutosaver.DELAY_MS)
+        self.timer.timeout.connect(self.save)
+
+    def watch(self, *signals):
+        """Restart the timer whenever one of the signals fires."""
+        for signal in signals:
+            signal.connect(lambda *args: self.timer.start())
+
+    def save(self):
+        fields = self.read_fields()
+        if fields != self.last_saved:
+            self.worker.write('save_draft', self.key, *fields)
+            self.last_saved = fields
+
+    def flush(self):
+        """Save a pending change right away, e.g. when the dialog closes."""
+        if self.timer.isActive():
+            self.timer.stop()
+            self.save()
+
+    def discard(self):
+        """Drop the draft after its entry has been saved."""
+        self.timer.stop()
+        self.worker.write('delete_draft', self.key)
+        self.last_saved = self.read_fields()
 
 
 class JournalApp(QMainWindow):
@@ -136,13 +154,12 @@ class JournalApp(QMainWindow):
     def __init__(self):
         super().__init__()
 
-        self.journal = Journal()
+        user = router.bound_user()  # This window's, even if someone else logs in meanwhile
+        self.journal = Journal(user)  # Paged reads for the entry list
+        self.worker = DatabaseWorker(functools.partial(Journal, user), self)  # Writes and searches, off the GUI thread
+        self.worker.start()
 
-        # Initialize pygame for playing music
-        pygame.mixer.init()
-        pygame.mixer.music.load("/Users/pedritos22/Desktop/relaxing_music.mp3")  # Load your relaxing music file here
-        pygame.mixer.music.set_volume(0.5)  # Set volume (0.0 to 1.0)
-        pygame.mixer.music.play(-1)  # Play the music indefinitely
+        self.music = MusicPlayer()  # Relaxing music from music.txt, started once the window is shown
 
         # Set window title and dimensions
         self.setWindowTitle("Journal Manager")
@@ -169,28 +186,85 @@ class JournalApp(QMainWindow):
         self.add_entry_btn.clicked.connect(self.add_entry)
         self.main_layout.addWidget(self.add_entry_btn)
 
+        # Import and Export Buttons, JSON lines, CSV or a folder of Markdown files
+        self.transfer_layout = QHBoxLayout()
+        self.import_btn = QPushButton("Import Entries", self)
+        self.import_btn.clicked.connect(lambda: TransferProgress(
+            self.worker, 'import_entries', "entries", self, finished=self.entries_imported))
+        self.transfer_layout.addWidget(self.import_btn)
+        self.export_btn = QPushButton("Export Entries", self)
+        self.export_btn.clicked.connect(lambda: TransferProgress(self.worker, 'export_entries', "entries", self))
+        self.transfer_layout.addWidget(self.export_btn)
+        self.main_layout.addLayout(self.transfer_layout)
+
+        # Diagnostics Button, only while instrumentation is recording
+        if instrumentation.enabled:
+            self.diagnostics_btn = QPushButton("Diagnostics", self)
+            self.diagnostics_btn.clicked.connect(self.show_diagnostics)
+            self.main_layout.addWidget(self.diagnostics_btn)
+
         # Footer Label
         self.footer_label = QLabel("Yournal™", self)
         self.footer_label.setAlignment(Qt.AlignCenter)
         self.footer_label.setStyleSheet("color: #AAB8C2; font-size: 14px;")
         self.main_layout.addWidget(self.footer_label)
 
+        # Search box, filters the list as the user types
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search entries...")
+        self.search_box.textChanged.connect(self.search_entries)
+        self.main_layout.addWidget(self.search_box)
+
+        # Search results, shown in place of the entry list while searching
+        self.search_results = QListWidget()
+        self.search_results.itemClicked.connect(self.show_search_result)
+        self.search_results.hide()
+        self.main_layout.addWidget(self.search_results)
+
         # Journal Entries List
-        self.entry_list = QListWidget()
-        self.entry_list.itemClicked.connect(self.show_entry_details)  # Show entry details on click
+        self.entry_model = JournalEntryModel(self.journal, self)
+        self.entry_list = QListView()
+        self.entry_list.setUniformItemSizes(True)  # Lets the view skip measuring every row
+        self.entry_list.setModel(self.entry_model)
+        self.entry_list.clicked.connect(self.show_entry_details)  # Show entry details on click
         self.main_layout.addWidget(self.entry_list)
 
         # Load entries on startup
         self.load_entries()
 
     def load_entries(self):
-        """Load all entries into the list widget."""
-        self.entry_list.clear()  # Clear the current list
-        entries = self.journal.get_all_entries()
-        for entry in entries:
-            item = QListWidgetItem(f"Entry #{entry[1]}: {entry[2]} - Mood: {entry[4]} (Date: {entry[5]})")
-            item.setData(Qt.UserRole, entry)  # Store the entire entry for later use
-            self.entry_list.addItem(item)
+        """Reload the entry list; rows are fetched in batches as the list scrolls."""
+        self.entry_model.reload()
+
+    def entries_imported(self):
+        self.load_entries()
+        self.search_entries(self.search_box.text())
+
+    def search_entries(self, text):
+        """Show the entries matching the search text, or the full list when it is empty."""
+        if not text.strip():
+            self.search_results.hide()
+            self.entry_list.show()
+            return
+        self.worker.read('search', text, callback=lambda results: self.show_search_results(text, results))
+
+    def show_search_results(self, text, results):
+        """Fill the search results list, unless the user has typed on since the search was sent."""
+        if text != self.search_box.text():
+            return
+        self.search_results.clear()
+        for entry_id, entry_number, title, snippet in results:
+            item = QListWidgetItem(f"Entry #{entry_number}: {title} - {snippet}")
+            item.setData(Qt.UserRole, entry_id)
+            self.search_results.addItem(item)
+        self.entry_list.hide()
+        self.search_results.show()
+
+    def show_search_result(self, item):
+        """Show the details of the clicked search result."""
+        entry = self.journal.get_entry(item.data(Qt.UserRole))
+        if entry:
+            self.show_entry_dialog(entry)
 
     def add_entry(self):
         """Show a dialog to add a new journal entry."""
@@ -217,25 +291,44 @@ class JournalApp(QMainWindow):
         layout.addWidget(QLabel("Mood:"))
         layout.addWidget(mood_combo)
 
+        # Restore the text of an entry that was never saved
+        draft = self.journal.get_draft('new')
+        if draft:
+            title_edit.setPlainText(draft[0])
+            content_edit.setPlainText(draft[1])
+            mood_combo.setCurrentText(draft[2])
+
+        autosaver = DraftAutosaver(
+            self.worker, 'new',
+            lambda: (title_edit.toPlainText(), content_edit.toPlainText(), mood_combo.currentText()), dialog
+        )
+        autosaver.watch(title_edit.textChanged, content_edit.textChanged, mood_combo.currentTextChanged)
+        dialog.finished.connect(autosaver.flush)
+
         # Add button
         add_btn = QPushButton("Add Entry")
-        add_btn.clicked.connect(lambda: self.save_entry(title_edit, content_edit, mood_combo))
+        add_btn.clicked.connect(lambda: self.save_entry(title_edit, content_edit, mood_combo, autosaver))
         layout.addWidget(add_btn)
 
         dialog.exec_()
 
-    def save_entry(self, title_edit, content_edit, mood_combo):
+    def save_entry(self, title_edit, content_edit, mood_combo, autosaver):
         """Save the new journal entry."""
         title = title_edit.toPlainText()[:JournalApp.TITLE_MAX_LENGTH]
         content = content_edit.toPlainText()
         mood = mood_combo.currentText()
-        result = self.journal.add_new_entry(title, content, mood)
+        self.worker.write('add_new_entry', title, content, mood, callback=self.entry_added)
+        autosaver.discard()
+
+    def entry_added(self, result):
         QMessageBox.information(self, "Entry Status", result)
-        self.load_entries()  # Refresh the entry list after adding
+        self.entry_model.load_new_entries()  # Show the new entry at the end of the list
+        self.search_entries(self.search_box.text())
 
-    def show_entry_details(self, item):
+    def show_entry_details(self, index):
         """Show the details of the clicked entry."""
-        entry = item.data(Qt.UserRole)  # Get the full entry data
+        summary = index.data(Qt.UserRole)
+        entry = summary and self.journal.get_entry(summary[0])  # Load the full entry only now
         if entry:
             self.show_entry_dialog(entry)
 
@@ -264,31 +357,70 @@ class JournalApp(QMainWindow):
         layout.addWidget(QLabel("Mood:"))
         layout.addWidget(mood_combo)
 
+        # Restore unsaved edits; drafts are keyed by id since numbers change on renumbering
+        draft_key = f"entry-{entry[0]}"
+        draft = self.journal.get_draft(draft_key)
+        if draft:
+            content_text.setPlainText(draft[1])
+            mood_combo.setCurrentText(draft[2])
+
+        autosaver = DraftAutosaver(
+            self.worker, draft_key, lambda: (entry[2], content_text.toPlainText(), mood_combo.currentText()), dialog
+        )
+        autosaver.watch(content_text.textChanged, mood_combo.currentTextChanged)
+        dialog.finished.connect(autosaver.flush)
+
         # Edit button
         edit_btn = QPushButton("Edit Entry")
-        edit_btn.clicked.connect(lambda: self.edit_entry(entry[1], content_text.toPlainText(), mood_combo.currentText(), dialog))
+        edit_btn.clicked.connect(lambda: self.edit_entry(entry[1], content_text.toPlainText(), mood_combo.currentText(), dialog, autosaver))
         layout.addWidget(edit_btn)
 
         # Delete button
         delete_btn = QPushButton("Delete Entry")
-        delete_btn.clicked.connect(lambda: self.delete_entry(entry[1], dialog))
+        delete_btn.clicked.connect(lambda: self.delete_entry(entry[1], dialog, autosaver))
         layout.addWidget(delete_btn)
 
         dialog.exec_()
 
-    def edit_entry(self, entry_number, new_content, new_mood, dialog):
+    def edit_entry(self, entry_number, new_content, new_mood, dialog, autosaver):
         """Edit the existing journal entry."""
-        result = self.journal.edit_entry(entry_number, new_content=new_content, new_mood=new_mood)
-        QMessageBox.information(self, "Entry Status", result)
+        self.worker.write(
+            'edit_entry', entry_number, new_content=new_content, new_mood=new_mood,
+            callback=lambda result: self.entry_edited(entry_number, result)
+        )
+        autosaver.discard()
         dialog.accept()  # Close the dialog
-        self.load_entries()  # Refresh the entry list after editing
 
-    def delete_entry(self, entry_number, dialog):
-        """Delete the specified journal entry."""
-        result = self.journal.delete_entry(entry_number)
+    def entry_edited(self, entry_number, result):
         QMessageBox.information(self, "Entry Status", result)
+        self.entry_model.entry_changed(entry_number)  # Repaint only the edited row
+        self.search_entries(self.search_box.text())
+
+    def delete_entry(self, entry_number, dialog, autosaver):
+        """Delete the specified journal entry."""
+        self.worker.write(
+            'delete_entry', entry_number, callback=lambda result: self.entry_deleted(entry_number, result)
+        )
+        autosaver.discard()
         dialog.accept()  # Close the dialog
-        self.load_entries()  # Refresh the entry list after deletion
+
+    def entry_deleted(self, entry_number, result):
+        QMessageBox.information(self, "Entry Status", result)
+        self.entry_model.entry_removed(entry_number)  # Drop only the deleted row
+        self.search_entries(self.search_box.text())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.music.start()
+
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec_()
+
+    def closeEvent(self, event):
+        self.music.stop()
+        self.worker.write('renumber_entries')  # Close the numbering gaps left by deletions
+        self.worker.stop()
+        event.accept()
 
 
 if __name__ == "__main__":
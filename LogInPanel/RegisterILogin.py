@@ -1,13 +1,12 @@
+import os
+import sys
 import sqlite3
-from cryptography.fernet import Fernet
 import tkinter as tk
 from tkinter import messagebox
 
-# Stały klucz do szyfrowania i deszyfrowania
-KEY = b'G1uOU6RQF_8jEBb-uDd9grbU8SPhXZcWxv1Whtw3PpA='  # Stały klucz
-
-# Obiekt Fernet do szyfrowania i deszyfrowania haseł
-cipher = Fernet(KEY)
+# Katalog główny repozytorium, aby zaimportować wspólny pakiet yournal
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yournal import router, users
 
 # Nazwa lokalnej bazy danych SQLite
 DATABASE_NAME = "users.db"
@@ -16,90 +15,37 @@ DATABASE_NAME = "users.db"
 logged_in_user = None
 
 
-def connect_to_db(database_name):
-    """Funkcja łącząca z lokalną bazą danych SQLite."""
-    try:
-        return sqlite3.connect(database_name)
-    except sqlite3.Error as e:
-        print(f"Błąd połączenia z bazą danych: {e}")
-        return None
-
-
 def register_user(username, password):
     """Funkcja rejestrująca nowego użytkownika z szyfrowaniem hasła."""
-    conn = connect_to_db(DATABASE_NAME)
-    if not conn:
-        return False
-
-    cursor = conn.cursor()
-    
-    # Tworzenie tabeli, jeśli nie istnieje
-    cursor.execute("""CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT NOT NULL UNIQUE,
-                        password BLOB NOT NULL
-                    );""")
-
-    # Sprawdzanie, czy użytkownik już istnieje
     try:
-        cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            messagebox.showerror("Błąd", f"Użytkownik '{username}' już istnieje.")
+        if not users.register_user(username, password, DATABASE_NAME):
+            messagebox.showerror("Błąd", f"Użytkownik '{username}' już istnieje (wielkość liter nie ma znaczenia).")
             return False
-    except Exception as e:
-        messagebox.showerror("Błąd", f"Błąd przy sprawdzaniu użytkownika: {e}")
-        return False
-
-    # Szyfrowanie hasła
-    encrypted_password = cipher.encrypt(password.encode())
-
-    try:
-        # Wstawianie nowego użytkownika
-        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, encrypted_password))
-        conn.commit()
-        messagebox.showinfo("Sukces", f"Użytkownik {username} został zarejestrowany.")
-        return True
-    except Exception as e:
+    except sqlite3.Error as e:
         messagebox.showerror("Błąd", f"Błąd przy rejestracji: {e}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
+    messagebox.showinfo("Sukces", f"Użytkownik {username} został zarejestrowany.")
+    return True
 
 
 def login_user(username, password):
     """Funkcja logowania użytkownika z odszyfrowaniem hasła."""
     global logged_in_user
-    conn = connect_to_db(DATABASE_NAME)
-    if not conn:
-        return False
-
-    cursor = conn.cursor()
-
     try:
-        # Pobieranie hasła dla danego użytkownika
-        cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
-        if result:
-            encrypted_password = result[0]
-            # Deszyfrowanie hasła
-            decrypted_password = cipher.decrypt(encrypted_password).decode()
-            if decrypted_password == password:
-                messagebox.showinfo("Sukces", "Zalogowano pomyślnie!")
-                logged_in_user = username  # Zapisanie nazwy zalogowanego użytkownika
-                return True
-            else:
-                messagebox.showerror("Błąd", "Niepoprawne hasło.")
-                return False
-        else:
-            messagebox.showerror("Błąd", "Użytkownik nie istnieje.")
-            return False
+        password_ok = users.check_password(username, password, DATABASE_NAME)
     except Exception as e:
         messagebox.showerror("Błąd", f"Błąd przy logowaniu: {e}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
+    if password_ok is None:
+        messagebox.showerror("Błąd", "Użytkownik nie istnieje.")
+        return False
+    if not password_ok:
+        messagebox.showerror("Błąd", "Niepoprawne hasło.")
+        return False
+    messagebox.showinfo("Sukces", "Zalogowano pomyślnie!")
+    logged_in_user = username  # Zapisanie nazwy zalogowanego użytkownika
+    router.set_user(username)  # Dziennik i zadania otwierane od teraz korzystają z baz tego użytkownika
+    return True
 
 
 def logout_user():
@@ -108,38 +54,28 @@ def logout_user():
     if logged_in_user:
         messagebox.showinfo("Wylogowanie", f"Wylogowano użytkownika: {logged_in_user}")
         logged_in_user = None
+        router.set_user(None)
     else:
         messagebox.showwarning("Brak zalogowanego użytkownika", "Nikt nie jest zalogowany.")
 
 
 def show_registered_users():
     """Funkcja wyświetlająca zarejestrowanych użytkowników oraz ich haseł."""
-    conn = connect_to_db(DATABASE_NAME)
-    if not conn:
-        return
-
-    cursor = conn.cursor()
-
     try:
-        # Pobieranie wszystkich użytkowników z bazy danych
-        cursor.execute("SELECT username, password FROM users")
-        users = cursor.fetchall()
-
-        if users:
-            user_list = "Lista zarejestrowanych użytkowników:\n\n"
-            user_list += "{:<20} | {:<}\n".format("Nazwa użytkownika", "Zaszyfrowane hasło")
-            user_list += "-" * 70 + "\n"
-            for user in users:
-                username, encrypted_password = user
-                user_list += f"{username:<20} | {encrypted_password}\n"
-            messagebox.showinfo("Zarejestrowani użytkownicy", user_list)
-        else:
-            messagebox.showinfo("Brak użytkowników", "Brak zarejestrowanych użytkowników.")
-    except Exception as e:
+        registered = users.list_users(DATABASE_NAME)
+    except sqlite3.Error as e:
         messagebox.showerror("Błąd", f"Błąd przy wyświetlaniu użytkowników: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        return
+
+    if registered:
+        user_list = "Lista zarejestrowanych użytkowników:\n\n"
+        user_list += "{:<20} | {:<}\n".format("Nazwa użytkownika", "Zaszyfrowane hasło")
+        user_list += "-" * 70 + "\n"
+        for username, encrypted_password in registered:
+            user_list += f"{username:<20} | {encrypted_password}\n"
+        messagebox.showinfo("Zarejestrowani użytkownicy", user_list)
+    else:
+        messagebox.showinfo("Brak użytkowników", "Brak zarejestrowanych użytkowników.")
 
 
 def show_main_menu():
@@ -162,7 +98,7 @@ def show_main_menu():
     btn_show_users = tk.Button(root, text="Zarejestrowani Użytkownicy", command=show_registered_users, bg="#4CAF50", fg="white", font=("Arial", 10, 'bold'), width=button_width, relief=tk.FLAT)
     btn_show_users.pack(pady=10)
 
-    btn_exit = tk.Button(root, text="Wyjście", command=root.quit, bg="#4CAF50", fg="white", font=("Arial", 10, 'bold'), width=button_width, relief=tk.FLAT)
+    btn_exit = tk.Button(root, text="Wyjście", command=root.destroy, bg="#4CAF50", fg="white", font=("Arial", 10, 'bold'), width=button_width, relief=tk.FLAT)
     btn_exit.pack(pady=10)
 
 
@@ -244,17 +180,18 @@ def clear_window():
         widget.destroy()
 
 
-def main():
-    """Główna funkcja uruchamiająca aplikację."""
+def main(master=None):
+    """Główna funkcja uruchamiająca aplikację; z `master` otwiera panel jako okno podrzędne."""
     global root
-    root = tk.Tk()
+    root = tk.Tk() if master is None else tk.Toplevel(master)
     root.title("Rejestracja i Logowanie")
     root.geometry("500x400")  # Ustawienie szerszego rozmiaru głównego okna
     root.configure(bg="#f0f0f0")  # Ustawienie tła głównego okna
 
     show_main_menu()  # Wyświetlenie głównego menu na starcie
 
-    root.mainloop()
+    if master is None:
+        root.mainloop()
 
 
 if __name__ == "__main__":
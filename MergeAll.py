@@ -1,15 +1,23 @@
 import sys
+import time
+
+STARTED = time.perf_counter()  # For --measure-startup
+
 import tkinter as tk
 from tkinter import ttk
-from Self_Goals import TaskApp  # Ensure TaskApp is properly defined
-from Journal import JournalApp  # Ensure JournalApp is defined
-from PyQt5.QtWidgets import QApplication
+
+# PyQt5, pygame and the sub-apps are imported when a sub-app is first opened
+
 
 class MainApp:
+    QT_EVENTS_INTERVAL_MS = 10  # How often the Tk loop lets Qt process its events
+
     def __init__(self, master):
         self.master = master
+        self.qt_app = None  # One QApplication for the whole process, created on first use
+        self.open_windows = 0
         self.master.title("We_Move")
-        self.master.geometry("400x300")
+        self.master.geometry("400x380")
         self.master.configure(bg='#F7E3D3')
 
         # Title label
@@ -27,6 +35,10 @@ class MainApp:
         task_button = ttk.Button(button_frame, text="Self Goals", command=self.open_task_app)
         task_button.pack(pady=10, ipadx=20, ipady=10, padx=10)
 
+        # The journal and tasks opened after logging in are the user's own
+        login_button = ttk.Button(button_frame, text="Log In", command=self.open_login_panel)
+        login_button.pack(pady=10, ipadx=20, ipady=10, padx=10)
+
         # Style the buttons
         style = ttk.Style()
         style.configure("TButton",
@@ -40,35 +52,64 @@ class MainApp:
         style.map("TButton",
                   background=[("active", "#FF7B57")])  # Change color on hover
 
-    def open_journal_app(self):
-        # Start the PyQt5 application
+    def qt_application(self):
+        """Get the shared QApplication, creating it and hooking it into the Tk loop on first use."""
+        if self.qt_app is None:
+            from PyQt5.QtWidgets import QApplication
+
+            self.qt_app = QApplication.instance() or QApplication(sys.argv)
+            self.qt_app.setQuitOnLastWindowClosed(False)  # The launcher keeps running
+            self.process_qt_events()
+        return self.qt_app
+
+    def process_qt_events(self):
+        self.qt_app.processEvents()
+        self.master.after(MainApp.QT_EVENTS_INTERVAL_MS, self.process_qt_events)
+
+    def open_window(self, window_class):
+        """Show a sub-app window, hiding the launcher until every sub-app window is closed."""
+        from PyQt5.QtCore import Qt
+
+        self.qt_application()
+        window = window_class()
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.destroyed.connect(self.window_closed)
+        self.open_windows += 1
+        window.show()
         self.master.withdraw()  # Hide the Tkinter window
-        app = QApplication(sys.argv)
 
-        # Create the JournalApp instance and show it
-        journal_app = JournalApp()
-        journal_app.show()
+    def window_closed(self):
+        self.open_windows -= 1
+        if not self.open_windows:
+            self.master.deiconify()  # Re-show the Tkinter window when done
 
-        # To keep the Tkinter window hidden while PyQt5 is running
-        app.exec_()
+    def open_login_panel(self):
+        from LogInPanel import RegisterILogin
 
-        # Re-show the Tkinter window when the PyQt app is closed
-        self.master.deiconify()
+        RegisterILogin.main(self.master)
+
+    def open_journal_app(self):
+        from Journal import JournalApp
+
+        self.open_window(JournalApp)
 
     def open_task_app(self):
         try:
-            # Open Task App in a new window using PyQt5
-            app = QApplication(sys.argv)
-            task_app = TaskApp()  # Create the TaskApp instance
-            task_app.show()
-            self.master.withdraw()  # Hide the Tkinter window
-            app.exec_()  # Run the PyQt5 application loop
-            self.master.deiconify()  # Re-show the Tkinter window when done
+            from Self_Goals import TaskApp
+
+            self.open_window(TaskApp)
         except Exception as e:
             print(f"Error opening task app: {e}")
 
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = MainApp(root)
-    root.mainloop()
+    if "--measure-startup" in sys.argv:
+        # Time until the launcher window is drawn, then exit
+        root.update()
+        print(f"Launcher started in {(time.perf_counter() - STARTED) * 1000:.1f} ms")
+        root.destroy()
+    else:
+        root.mainloop()
 
@@ -1,85 +1,122 @@
+import functools
 import sys
-import sqlite3
+from datetime import date
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton,
-    QLineEdit, QListWidget, QMessageBox, QWidget, QLabel, QInputDialog  # Import QInputDialog here
+    QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox,
+    QLineEdit, QListView, QMessageBox, QWidget, QLabel, QInputDialog  # Import QInputDialog here
 )
-from PyQt5.QtCore import Qt
-
-
-class Task:
-    def __init__(self, id, description, completed=False):
-        self.id = id
-        self.description = description
-        self.completed = completed
-
-    def mark_completed(self):
-        self.completed = True
-
-    def __str__(self):
-        status = "[X]" if self.completed else "[ ]"
-        return f"{status} {self.description}"
-
-
-class TaskList:
-    def __init__(self):
-        self.conn = sqlite3.connect('tasks.db')
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                description TEXT NOT NULL,
-                completed INTEGER NOT NULL
-            )
-        ''')
-        self.conn.commit()
-        self.load_tasks()
-
-    def load_tasks(self):
-        self.tasks = []
-        self.cursor.execute("SELECT id, description, completed FROM tasks")
-        rows = self.cursor.fetchall()
-        for row in rows:
-            task = Task(row[0], row[1], bool(row[2]))
-            self.tasks.append(task)
-
-    def add_task(self, description):
-        task = Task(None, description)
-        self.tasks.append(task)
-        self.cursor.execute("INSERT INTO tasks (description, completed) VALUES (?, ?)", (description, 0))
-        self.conn.commit()
-        return task.id  # Return the ID of the newly added task
-
-    def complete_tasks(self, indices):
-        for index in indices:
-            if 0 <= index < len(self.tasks):
-                task_id = self.tasks[index].id
-                self.tasks[index].mark_completed()
-                self.cursor.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (task_id,))
-        self.conn.commit()
-
-    def remove_completed_tasks(self, indices):
-        for index in sorted(indices, reverse=True):
-            task_id = self.tasks[index].id
-            self.cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-            del self.tasks[index]
-        self.conn.commit()
-
-    def edit_task(self, index, new_description):
-        if 0 <= index < len(self.tasks):
-            task_id = self.tasks[index].id
-            self.cursor.execute("UPDATE tasks SET description = ? WHERE id = ?", (new_description, task_id))
-            self.tasks[index].description = new_description
-            self.conn.commit()
-
-    def show_tasks(self):
-        return [str(task) for task in self.tasks]
-
-    def close(self):
-        self.conn.close()
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+from yournal import instrumentation, router
+from yournal.diagnostics import DiagnosticsDialog
+from yournal.tasks import TaskList
+from yournal.transfer_dialog import TransferProgress
+from yournal.worker import DatabaseWorker
+
+
+class TaskListModel(QAbstractListModel):
+    """List model mirroring the worker's TaskList, changed row by row as each edit is saved.
+
+    Only the affected rows are inserted, repainted or removed, so the view keeps its
+    selection and scroll position. Saved changes find their rows by task id, as rows
+    can move while a write waits in the worker's queue.
+    """
+    ID, DESCRIPTION, COMPLETED, PRIORITY, DUE_DATE, RECURRENCE, CURRENT_STREAK, LONGEST_STREAK = range(8)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tasks = []  # Lists in the field order above (see TaskList.rows), in TaskList order
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.DisplayRole:
+            status = "[X]" if task[TaskListModel.COMPLETED] else "[ ]"
+            text = f"{status} {task[TaskListModel.DESCRIPTION]}"
+            if task[TaskListModel.PRIORITY]:
+                text += f" (priority {task[TaskListModel.PRIORITY]})"
+            if task[TaskListModel.DUE_DATE]:
+                text += f" - due {task[TaskListModel.DUE_DATE]}"
+            if task[TaskListModel.RECURRENCE]:
+                text += (f" - {task[TaskListModel.RECURRENCE]}, streak {task[TaskListModel.CURRENT_STREAK]}"
+                         f" (best {task[TaskListModel.LONGEST_STREAK]})")
+            return text
+        if role == Qt.UserRole:
+            return task[TaskListModel.ID]
+        return None
+
+    def set_tasks(self, rows):
+        self.beginResetModel()
+        self.tasks = [list(row) for row in rows]
+        self.endResetModel()
+
+    def task_added(self, task_id, description, recurrence=None):
+        row = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.tasks.append([task_id, description, False, 0, None, recurrence, 0, 0])
+        self.endInsertRows()
+
+    def replace_tasks(self, task_rows):
+        """Take updated rows ({task id: TaskList row}) and repaint just those rows."""
+        for row in self.rows_of(task_rows):
+            self.tasks[row] = list(task_rows[self.tasks[row][TaskListModel.ID]])
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def set_fields(self, task_ids, fields):
+        """Change fields ({field: value}) of the given tasks and repaint just their rows."""
+        for row in self.rows_of(task_ids):
+            for field, value in fields.items():
+                self.tasks[row][field] = value
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def remove_tasks(self, task_ids):
+        """Remove the given tasks, one contiguous run of rows at a time from the bottom up."""
+        rows = sorted(self.rows_of(task_ids), reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.tasks[first:last + 1]
+            self.endRemoveRows()
+
+    def rows_of(self, task_ids):
+        """Rows of the tasks with the given ids, skipping any no longer in the model."""
+        wanted = set(task_ids)
+        return [row for row, task in enumerate(self.tasks) if task[TaskListModel.ID] in wanted]
+
+
+class TaskRankingModel(QSortFilterProxyModel):
+    """Shows every task in TaskList order, or only the ranked tasks in rank order."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ranks = None  # Task id -> position, or None for every task
+
+    def set_ranking(self, task_ids):
+        self.ranks = None if task_ids is None else {task_id: rank for rank, task_id in enumerate(task_ids)}
+        self.invalidate()
+        self.sort(-1 if self.ranks is None else 0)  # -1 restores the source order
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.ranks is None or self.sourceModel().tasks[source_row][TaskListModel.ID] in self.ranks
+
+    def lessThan(self, left, right):
+        return self.ranks[left.data(Qt.UserRole)] < self.ranks[right.data(Qt.UserRole)]
 
 
 class TaskApp(QMainWindow):
+    VIEWS = [("All tasks", None), ("Next to do", 'next_tasks'), ("Overdue", 'overdue_tasks')]  # (label, TaskList query)
+    NEXT_COUNT = 20
+    REPEATS = [("Never", None), ("Daily", 'daily'), ("Weekly", 'weekly')]
+    HISTORY_LENGTH = 30
+
     def __init__(self):
         super().__init__()
 
@@ -90,7 +127,9 @@ class TaskApp(QMainWindow):
         self.setCentralWidget(self.main_widget)
         self.main_layout = QVBoxLayout(self.main_widget)
 
-        self.task_list = TaskList()
+        user = router.bound_user()  # This window's, even if someone else logs in meanwhile
+        self.worker = DatabaseWorker(functools.partial(TaskList, user), self)  # Owns the task list, off the GUI thread
+        self.worker.start()
 
         # Title label
         self.title_label = QLabel("Task List", self)
@@ -101,15 +140,29 @@ class TaskApp(QMainWindow):
         self.task_entry.setPlaceholderText("Enter a new task...")
         self.main_layout.addWidget(self.task_entry)
 
+        self.repeat_combo = QComboBox(self)
+        self.repeat_combo.addItems([f"Repeat: {label}" for label, recurrence in TaskApp.REPEATS])
+        self.main_layout.addWidget(self.repeat_combo)
+
         self.add_button = QPushButton("Add Task", self)
         self.add_button.clicked.connect(self.add_task)
         self.add_button.setShortcut("Ctrl+A")  # Keyboard shortcut for adding tasks
         self.main_layout.addWidget(self.add_button)
 
-        self.task_list_widget = QListWidget(self)
-        self.task_list_widget.setSelectionMode(QListWidget.MultiSelection)
+        self.view_combo = QComboBox(self)
+        self.view_combo.addItems([label for label, query in TaskApp.VIEWS])
+        self.view_combo.currentIndexChanged.connect(self.refresh_view)
+        self.main_layout.addWidget(self.view_combo)
+
+        self.task_model = TaskListModel(self)
+        self.task_view_model = TaskRankingModel(self)
+        self.task_view_model.setSourceModel(self.task_model)
+        self.task_list_view = QListView(self)
+        self.task_list_view.setModel(self.task_view_model)
+        self.task_list_view.setSelectionMode(QListView.MultiSelection)
+        self.task_list_view.setUniformItemSizes(True)  # Rows are one line each, so skip measuring them
         self.update_task_list()
-        self.main_layout.addWidget(self.task_list_widget)
+        self.main_layout.addWidget(self.task_list_view)
 
         self.button_layout = QHBoxLayout()
 
@@ -128,31 +181,58 @@ class TaskApp(QMainWindow):
         self.edit_button.setShortcut("Ctrl+E")  # Keyboard shortcut for editing tasks
         self.button_layout.addWidget(self.edit_button)
 
+        self.schedule_button = QPushButton("Schedule Selected Task", self)
+        self.schedule_button.clicked.connect(self.schedule_selected_task)
+        self.button_layout.addWidget(self.schedule_button)
+
+        self.history_button = QPushButton("Show History", self)
+        self.history_button.clicked.connect(self.show_selected_history)
+        self.button_layout.addWidget(self.history_button)
+
         self.main_layout.addLayout(self.button_layout)
 
+        self.transfer_layout = QHBoxLayout()
+        self.import_button = QPushButton("Import Tasks", self)
+        self.import_button.clicked.connect(lambda: TransferProgress(
+            self.worker, 'import_tasks', "tasks", self, finished=self.tasks_imported))
+        self.transfer_layout.addWidget(self.import_button)
+        self.export_button = QPushButton("Export Tasks", self)
+        self.export_button.clicked.connect(lambda: TransferProgress(self.worker, 'export_tasks', "tasks", self))
+        self.transfer_layout.addWidget(self.export_button)
+        self.main_layout.addLayout(self.transfer_layout)
+
+        if instrumentation.enabled:  # Only while instrumentation is recording
+            self.diagnostics_button = QPushButton("Diagnostics", self)
+            self.diagnostics_button.clicked.connect(self.show_diagnostics)
+            self.main_layout.addWidget(self.diagnostics_button)
+
     def add_task(self):
         task_description = self.task_entry.text().strip()
         if task_description and len(task_description) <= 100:
-            task_id = self.task_list.add_task(task_description)
+            recurrence = TaskApp.REPEATS[self.repeat_combo.currentIndex()][1]
+            self.worker.write(
+                'add_task', task_description, recurrence=recurrence,
+                callback=lambda task_id: self.tasks_saved(
+                    f"Task '{task_description}' added successfully.",
+                    self.task_model.task_added, task_id, task_description, recurrence
+                )
+            )
             self.task_entry.clear()
-            self.update_task_list()
-            QMessageBox.information(self, "Success", f"Task '{task_description}' added successfully.")
         else:
             QMessageBox.warning(self, "Invalid Task", "Please enter a valid task description (1-100 characters).")
 
     def complete_selected_tasks(self):
-        selected_items = self.task_list_widget.selectedItems()
-        if selected_items:
-            indices = [self.task_list_widget.row(item) for item in selected_items]
-            self.task_list.complete_tasks(indices)
-            self.update_task_list()
-            QMessageBox.information(self, "Success", "Selected tasks marked as completed. Good Job!")
+        task_ids = self.selected_task_ids()
+        if task_ids:
+            self.worker.write('complete_task_ids', task_ids, callback=lambda task_rows: self.tasks_saved(
+                "Selected tasks marked as completed. Good Job!", self.task_model.replace_tasks, task_rows
+            ))
         else:
             QMessageBox.warning(self, "Error", "Select at least one task to mark as completed.")
 
     def remove_selected_tasks(self):
-        selected_items = self.task_list_widget.selectedItems()
-        if selected_items:
+        task_ids = self.selected_task_ids()
+        if task_ids:
             confirmation = QMessageBox.question(
                 self,
                 "Confirm Deletion",
@@ -161,34 +241,109 @@ class TaskApp(QMainWindow):
                 QMessageBox.No
             )
             if confirmation == QMessageBox.Yes:
-                indices = [self.task_list_widget.row(item) for item in selected_items]
-                self.task_list.remove_completed_tasks(indices)
-                self.update_task_list()
-                QMessageBox.information(self, "Success", "Selected tasks removed successfully.")
+                self.worker.write('remove_task_ids', task_ids, callback=lambda result: self.tasks_saved(
+                    "Selected tasks removed successfully.", self.task_model.remove_tasks, task_ids
+                ))
         else:
             QMessageBox.warning(self, "Error", "Select at least one task to remove.")
 
     def edit_selected_task(self):
-        selected_items = self.task_list_widget.selectedItems()
-        if selected_items:
-            index = self.task_list_widget.row(selected_items[0])  # Edit only the first selected item
+        task_ids = self.selected_task_ids()
+        if task_ids:
+            task_id = task_ids[0]  # Edit only the first selected item
             new_description, ok = QInputDialog.getText(self, "Edit Task", "New Task Description:")
             if ok and new_description.strip():
-                self.task_list.edit_task(index, new_description)
-                self.update_task_list()
-                QMessageBox.information(self, "Success", "Task edited successfully.")
+                self.worker.write('edit_task_id', task_id, new_description, callback=lambda result: self.tasks_saved(
+                    "Task edited successfully.", self.task_model.set_fields, [task_id],
+                    {TaskListModel.DESCRIPTION: new_description}
+                ))
             else:
                 QMessageBox.warning(self, "Invalid Task", "Please enter a valid task description.")
         else:
             QMessageBox.warning(self, "Error", "Select a task to edit.")
 
+    def schedule_selected_task(self):
+        task_ids = self.selected_task_ids()
+        if not task_ids:
+            QMessageBox.warning(self, "Error", "Select a task to schedule.")
+            return
+        task_id = task_ids[0]
+        task = self.task_model.tasks[self.task_model.rows_of([task_id])[0]]
+        priority, ok = QInputDialog.getInt(self, "Schedule Task", "Priority (higher comes first):",
+                                           task[TaskListModel.PRIORITY])
+        if not ok:
+            return
+        due_date, ok = QInputDialog.getText(self, "Schedule Task", "Due date (YYYY-MM-DD, empty for none):",
+                                            text=task[TaskListModel.DUE_DATE] or "")
+        if not ok:
+            return
+        try:
+            due_date = date.fromisoformat(due_date.strip()).isoformat() if due_date.strip() else None
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Date", "Please enter the due date as YYYY-MM-DD.")
+            return
+        self.worker.write('schedule_task_id', task_id, priority, due_date, callback=lambda result: self.tasks_saved(
+            "Task scheduled successfully.", self.task_model.set_fields, [task_id],
+            {TaskListModel.PRIORITY: priority, TaskListModel.DUE_DATE: due_date}
+        ))
+
+    def show_selected_history(self):
+        task_ids = self.selected_task_ids()
+        if task_ids:
+            self.worker.read('task_history', task_ids[0], TaskApp.HISTORY_LENGTH, callback=self.show_history)
+        else:
+            QMessageBox.warning(self, "Error", "Select a task to show its history.")
+
+    def show_history(self, result):
+        task, checkins = result
+        if task is None:
+            return
+        if not task[TaskListModel.RECURRENCE]:
+            QMessageBox.information(self, "History", "Only repeating tasks keep a check-in history.")
+            return
+        lines = [
+            f"{task[TaskListModel.DESCRIPTION]} ({task[TaskListModel.RECURRENCE]})",
+            f"Current streak: {task[TaskListModel.CURRENT_STREAK]}, longest: {task[TaskListModel.LONGEST_STREAK]}",
+            "",
+        ]
+        lines += [f"{period}: checked in at {completed_at}" for period, completed_at in checkins]
+        if not checkins:
+            lines.append("No check-ins yet.")
+        QMessageBox.information(self, "History", "\n".join(lines))
+
+    def selected_task_ids(self):
+        """Ids of the selected tasks, in list order; unlike rows, they stay valid while writes are queued."""
+        indexes = self.task_list_view.selectionModel().selectedIndexes()
+        rows = sorted(self.task_view_model.mapToSource(index).row() for index in indexes)
+        return [self.task_model.tasks[row][TaskListModel.ID] for row in rows]
+
+    def tasks_saved(self, message, apply_change, *args):
+        apply_change(*args)  # Mirror the saved change in the model, touching only its rows
+        self.refresh_view()
+        QMessageBox.information(self, "Success", message)
+
     def update_task_list(self):
-        self.task_list_widget.clear()
-        for task in self.task_list.show_tasks():
-            self.task_list_widget.addItem(task)
+        self.worker.read('task_rows', callback=self.task_model.set_tasks)
+
+    def tasks_imported(self):
+        self.update_task_list()  # import_tasks reloaded the worker's task list
+        self.refresh_view()
+
+    def refresh_view(self):
+        """Re-run the selected view's query; the tasks themselves are already in the model."""
+        query = TaskApp.VIEWS[self.view_combo.currentIndex()][1]
+        if query is None:
+            if self.task_view_model.ranks is not None:
+                self.task_view_model.set_ranking(None)
+            return
+        args = (TaskApp.NEXT_COUNT,) if query == 'next_tasks' else ()
+        self.worker.read(query, *args, callback=lambda rows: self.task_view_model.set_ranking([row[0] for row in rows]))
+
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec_()
 
     def closeEvent(self, event):
-        self.task_list.close()
+        self.worker.stop()  # Also closes the worker's tasks.db connection
         event.accept()
 
 
@@ -1,4 +1,6 @@
 class Task:
+    __slots__ = ('description', 'completed')
+
     def __init__(self, description):
         self.description = description
         self.completed = False
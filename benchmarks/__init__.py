@@ -0,0 +1,4 @@
+"""Headless benchmarks of the Yournal storage and UI code paths.
+
+Run `python -m benchmarks` from the repository root; see `python -m benchmarks --help`.
+"""
@@ -0,0 +1,164 @@
+"""Time the Yournal code paths on synthetic data and print the results as JSON.
+
+    python -m benchmarks [--sizes 1000 100000 1000000] [--output results.json]
+
+Each size gets fresh journal.db, tasks.db and users.db files in a temporary
+directory, which becomes the working directory while its benchmarks run, as the
+apps open their databases by relative path. Qt runs offscreen and audio uses the
+dummy SDL driver, so no display or sound device is needed.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from yournal import storage, users  # noqa: E402
+from yournal.journal import Journal  # noqa: E402
+from yournal.tasks import TaskList  # noqa: E402
+from benchmarks import datasets  # noqa: E402
+
+SIZES = (1000, 100000, 1000000)
+REPEAT = 5  # Runs of the quick benchmarks; the full-table ones run fewer times
+COMPLETE_COUNT = 1000  # Tasks completed per complete_tasks call
+
+
+def measure(results, name, rows, func, repeat=REPEAT, setup=None):
+    """Time `func` `repeat` times (after `setup`, untimed) and record the seconds taken."""
+    seconds = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    results.append({
+        'benchmark': name,
+        'rows': rows,
+        'repeat': repeat,
+        'min': min(seconds),
+        'median': statistics.median(seconds),
+        'seconds': seconds,
+    })
+    print(f"{name:<40} {rows:>9} rows  min {min(seconds) * 1000:10.2f} ms", file=sys.stderr)
+
+
+def journal_benchmarks(results, rows):
+    journal = Journal()
+    measure(results, 'journal.add_new_entry', rows,
+            lambda: journal.add_new_entry("Benchmark", "Added by the benchmark.", "Happy"))
+    measure(results, 'journal.get_all_entries', rows, journal.get_all_entries, repeat=3)
+    middle = rows // 2
+    measure(results, 'journal.edit_entry', rows,
+            lambda: journal.edit_entry(middle, "Edited", "Edited by the benchmark.", "Relaxed"))
+
+    def delete_and_renumber():
+        journal.delete_entry(rows // 3)
+        journal.renumber_entries()
+    measure(results, 'journal.delete_entry+renumber_entries', rows, delete_and_renumber, repeat=3)
+
+
+def task_benchmarks(results, rows):
+    task_list = TaskList()
+    measure(results, 'tasks.load_tasks', rows, task_list.load_tasks, repeat=3)
+    rng = random.Random(datasets.SEED)
+    indices = []
+
+    def pick_tasks():
+        indices[:] = rng.sample(range(len(task_list.tasks)), min(COMPLETE_COUNT, rows))
+    measure(results, 'tasks.complete_tasks', rows, lambda: task_list.complete_tasks(indices), repeat=3,
+            setup=pick_tasks)
+
+
+def user_benchmarks(results, rows):
+    measure(results, 'users.check_password', rows, lambda: users.check_password(datasets.USERNAME, datasets.PASSWORD))
+
+
+def app_benchmarks(results, rows, qt_app):
+    from Journal_M import JournalApp
+
+    window = JournalApp()
+    window.show()
+    qt_app.processEvents()
+
+    def load_entries():
+        window.load_entries()
+        qt_app.processEvents()  # The view lays out and fetches the first page here
+    measure(results, 'journal_app.load_entries', rows, load_entries)
+    window.close()
+
+
+def run(sizes, keep=False):
+    from PyQt5.QtWidgets import QApplication
+
+    qt_app = QApplication.instance() or QApplication(sys.argv)
+    encrypted_password = users.cipher().encrypt(datasets.PASSWORD.encode())
+    results = []
+    start_dir = os.getcwd()
+    for rows in sizes:
+        directory = tempfile.mkdtemp(prefix=f'yournal-bench-{rows}-')
+        measure(results, 'datasets.generate', rows,
+                lambda: datasets.make_dataset(directory, rows, encrypted_password), repeat=1)
+        os.chdir(directory)
+        try:
+            journal_benchmarks(results, rows)
+            task_benchmarks(results, rows)
+            user_benchmarks(results, rows)
+            app_benchmarks(results, rows, qt_app)
+        finally:
+            os.chdir(start_dir)
+            storage.close_all()
+            if keep:
+                print(f"Kept the {rows}-row databases in {directory}", file=sys.stderr)
+            else:
+                shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="rows per table (default: %(default)s)")
+    parser.add_argument('--output', help="write the JSON here instead of to stdout")
+    parser.add_argument('--keep', action='store_true', help="keep the generated databases")
+    args = parser.parse_args(argv)
+
+    report = {
+        'commit': git_commit(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'results': run(args.sizes, args.keep),
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Synthetic journal.db, tasks.db and users.db files for the benchmarks.
+
+The data goes through the real migrations and triggers (search index, mood rollups),
+so the files look like ones the apps built themselves. A fixed seed keeps every run
+on the same data.
+"""
+import datetime
+import os
+import random
+
+from yournal import storage
+from yournal.migrations import JOURNAL_MIGRATIONS, TASK_MIGRATIONS, USER_MIGRATIONS
+
+CHUNK_SIZE = 10000  # Rows per transaction
+SEED = 20240101
+WORDS = (
+    "today felt calm busy tired grateful walk coffee friend work family rain sun "
+    "music book sleep morning evening plan goal run quiet long short happy worried"
+).split()
+MOODS = ["Happy", "Sad", "Relaxed", "Angry", "Excited", "Anxious", "Bored", "Grateful"]
+FIRST_DAY = datetime.datetime(2015, 1, 1, 8, 0)
+
+USERNAME = "bench_user"  # Row 0 of users.db; logs in with PASSWORD
+PASSWORD = "bench-password"
+
+
+def insert_in_chunks(conn, sql, rows):
+    """Insert `rows` with executemany, committing every CHUNK_SIZE rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            with conn:
+                conn.executemany(sql, chunk)
+            chunk = []
+    if chunk:
+        with conn:
+            conn.executemany(sql, chunk)
+
+
+def make_journal(path, rows):
+    """Write a journal.db with `rows` entries, numbered 1..rows, a few hours apart."""
+    rng = random.Random(SEED)
+
+    def entries():
+        for number in range(1, rows + 1):
+            created = FIRST_DAY + datetime.timedelta(hours=7 * number)
+            yield (
+                number,
+                f"Entry {number}: {' '.join(rng.choices(WORDS, k=3))}",
+                ' '.join(rng.choices(WORDS, k=rng.randint(15, 40))),
+                rng.choice(MOODS),
+                created.strftime("%d-%m-%Y"),
+                created.strftime("%Y-%m-%dT%H:%M:%S"),
+            )
+
+    conn = storage.open_connection(path, JOURNAL_MIGRATIONS)
+    try:
+        insert_in_chunks(conn, '''
+            INSERT INTO journal_entries (number, title, content, mood, date, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', entries())
+    finally:
+        conn.close()
+
+
+def make_tasks(path, rows):
+    """Write a tasks.db with `rows` tasks: a third completed, some prioritised or dated."""
+    rng = random.Random(SEED)
+
+    def tasks():
+        for number in range(rows):
+            due_date = None
+            if rng.random() < 0.3:
+                due_date = (FIRST_DAY + datetime.timedelta(days=rng.randint(0, 4000))).date().isoformat()
+            yield (f"Goal {number % 1000}: {' '.join(rng.choices(WORDS, k=3))}",
+                   int(number % 3 == 0), rng.randint(0, 5), due_date)
+
+    conn = storage.open_connection(path, TASK_MIGRATIONS)
+    try:
+        insert_in_chunks(conn, '''
+            INSERT INTO tasks (description, completed, priority, due_date) VALUES (?, ?, ?, ?)
+        ''', tasks())
+    finally:
+        conn.close()
+
+
+def make_users(path, rows, encrypted_password):
+    """Write a users.db with `rows` users sharing one encrypted password.
+
+    Encrypting once keeps generation fast at 1M rows; every token still decrypts.
+    """
+    conn = storage.open_connection(path, USER_MIGRATIONS)
+    try:
+        insert_in_chunks(conn, 'INSERT INTO users (username, password) VALUES (?, ?)', (
+            (USERNAME if number == 0 else f"user_{number}", encrypted_password) for number in range(rows)
+        ))
+    finally:
+        conn.close()
+
+
+def make_dataset(directory, rows, encrypted_password):
+    """Write all three databases for one size into `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    make_journal(os.path.join(directory, 'journal.db'), rows)
+    make_tasks(os.path.join(directory, 'tasks.db'), rows)
+    make_users(os.path.join(directory, 'users.db'), rows, encrypted_password)
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yournal import storage  # noqa: E402
+from yournal.journal import Journal  # noqa: E402
+
+
+class MoodHistogramTest(unittest.TestCase):
+    def setUp(self):
+        self.start_dir = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        self.journal = Journal()
+        with self.journal.conn:
+            self.journal.conn.executemany('''
+                INSERT INTO journal_entries (number, title, content, mood, date, created_at)
+                VALUES (?, '', '', ?, ?, ?)
+            ''', [(1, 'Sad', '18-10-2026', '2026-10-18T09:00:00'),  # A Sunday, in the week of 12 October
+                  (2, 'Happy', '20-10-2026', '2026-10-20T09:00:00')])
+
+    def tearDown(self):
+        storage.close_all()
+        os.chdir(self.start_dir)
+        self.directory.cleanup()
+
+    def test_day_buckets(self):
+        self.assertEqual(self.journal.mood_histogram('2026-10-18', '2026-10-18'), [('2026-10-18', 'Sad', 1)])
+
+    def test_week_containing_a_mid_week_start(self):
+        self.assertEqual(self.journal.mood_histogram('2026-10-18', '2026-10-18', 'week'),
+                         [('2026-10-12', 'Sad', 1)])
+        self.assertEqual(self.journal.mood_histogram('2026-10-14', '2026-10-31', 'week'),
+                         [('2026-10-12', 'Sad', 1), ('2026-10-19', 'Happy', 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import contextlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yournal import storage, sync  # noqa: E402
+from yournal.journal import Journal  # noqa: E402
+from yournal.tasks import TaskList  # noqa: E402
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.start_dir = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+        os.mkdir('a')
+
+    def tearDown(self):
+        storage.close_all()
+        os.chdir(self.start_dir)
+        self.directory.cleanup()
+
+    @contextlib.contextmanager
+    def copy(self, name):
+        """Work in the copy in folder `name`, as the apps do in their working directory."""
+        os.chdir(name)
+        try:
+            yield
+        finally:
+            storage.close_all()
+            os.chdir(self.directory.name)
+
+    def entries(self, name):
+        with self.copy(name):
+            return sorted((title, content) for _, _, title, content, *_ in Journal().get_all_entries())
+
+    def add_entries(self, name, *titles):
+        with self.copy(name):
+            for title in titles:
+                Journal().add_new_entry(title, 'text')
+
+    def edit_entry(self, name, number, content):
+        with self.copy(name):
+            Journal().edit_entry(number, new_content=content)
+
+    def delete_entry(self, name, number):
+        with self.copy(name):
+            Journal().delete_entry(number)
+
+    def sync(self, name, peer):
+        with self.copy(name):
+            result = Journal().sync(os.path.join('..', peer))
+        return result.pulled, result.pushed
+
+    def test_copies_made_before_the_upgrade_match_their_rows(self):
+        conn = sqlite3.connect('a/journal.db')  # The schema from before the migrations
+        conn.execute('''
+            CREATE TABLE journal_entries (id INTEGER PRIMARY KEY AUTOINCREMENT, number INTEGER,
+                                          title TEXT, content TEXT, mood TEXT, date TEXT)
+        ''')
+        conn.executemany('''
+            INSERT INTO journal_entries (number, title, content, date) VALUES (?, ?, 'text', '01-10-2026')
+        ''', [(1, 't1'), (2, 't2'), (3, 't3')])
+        conn.commit()
+        conn.close()
+        shutil.copytree('a', 'b')
+        self.add_entries('a', 'only in a')
+        self.add_entries('b', 'only in b')
+
+        self.assertEqual(self.sync('b', 'a'), (1, 1))
+        expected = [('only in a', 'text'), ('only in b', 'text'), ('t1', 'text'), ('t2', 'text'), ('t3', 'text')]
+        self.assertEqual(self.entries('a'), expected)
+        self.assertEqual(self.entries('b'), expected)
+        self.assertEqual(self.sync('a', 'b'), (0, 0))
+
+    def test_copy_of_a_synced_file_needs_a_new_site(self):
+        self.add_entries('a', 't1', 't2')
+        shutil.copytree('a', 'b')
+        with self.assertRaises(ValueError):
+            self.sync('b', 'a')
+
+        with self.copy('b'):
+            Journal().new_sync_site()
+        self.add_entries('b', 'only in b')
+        self.add_entries('a', 'only in a')
+        self.assertEqual(self.sync('b', 'a'), (1, 1))
+        expected = [('only in a', 'text'), ('only in b', 'text'), ('t1', 'text'), ('t2', 'text')]
+        self.assertEqual(self.entries('a'), expected)
+        self.assertEqual(self.entries('b'), expected)
+
+    def test_conflicting_edits_settle_on_the_later_version(self):
+        self.add_entries('a', 't1')
+        os.mkdir('b')
+        self.sync('b', 'a')
+        self.edit_entry('a', 1, 'first edit in a')
+        self.edit_entry('a', 1, 'second edit in a')  # Version 3, against version 2 in b
+        self.edit_entry('b', 1, 'edit in b')
+
+        self.sync('b', 'a')
+        self.assertEqual(self.entries('a'), [('t1', 'second edit in a')])
+        self.assertEqual(self.entries('b'), [('t1', 'second edit in a')])
+
+    def test_deletions_sync_and_later_edits_win_over_them(self):
+        self.add_entries('a', 't1', 't2')
+        os.mkdir('b')
+        self.sync('b', 'a')
+        self.delete_entry('a', 1)
+        self.sync('b', 'a')
+        self.assertEqual(self.entries('b'), [('t2', 'text')])
+
+        self.delete_entry('b', 2)  # Version 2, against version 3 in a
+        self.edit_entry('a', 2, 'edited')
+        self.edit_entry('a', 2, 'edited again')
+        self.sync('a', 'b')
+        self.assertEqual(self.entries('a'), [('t2', 'edited again')])
+        self.assertEqual(self.entries('b'), [('t2', 'edited again')])
+
+    def test_tasks_sync(self):
+        with self.copy('a'):
+            TaskList().add_task('water the plants')
+        os.mkdir('b')
+        with self.copy('b'):
+            self.assertEqual(TaskList().sync(os.path.join('..', 'a')).pulled, 1)
+            self.assertEqual([task.description for task in TaskList().tasks], ['water the plants'])
+
+    def test_payloads_must_list_the_synced_columns(self):
+        with self.copy('a'):
+            conn = Journal().conn
+            for payload in ({'columns': ['title = 1; --'], 'changes': []},
+                            {'columns': ['title', 'content', 'mood', 'date', 'created_at'],
+                             'changes': [['uid', 'insert', 1, 'now', 'site', ['too few']]]}):
+                with self.assertRaises(ValueError):
+                    sync.apply_changes(conn, 'journal_entries', payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
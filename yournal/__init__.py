@@ -0,0 +1,4 @@
+"""Storage layer shared by the Yournal apps, free of GUI imports except in worker and diagnostics.
+
+Run `python -m yournal --help` for the command line interface.
+"""
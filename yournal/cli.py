@@ -0,0 +1,331 @@
+"""Command line access to the journal, tasks and users, without any GUI imports.
+
+    python -m yournal [--dir DIR] [--user NAME] entries add|list|search|export|import ...
+    python -m yournal [--dir DIR] [--user NAME] tasks list|add|complete|export|import ...
+    python -m yournal [--dir DIR] users add|list|check|passwd|delete|split-shared ...
+    python -m yournal [--dir DIR] [--user NAME] sync FOLDER|URL [--token TOKEN]
+    python -m yournal [--dir DIR] [--user NAME] new-site
+    python -m yournal [--dir DIR] [--user NAME] serve [--host HOST] [--port PORT] [--token TOKEN]
+
+The databases are opened in --dir (default: the current directory), like the apps
+open them in their working directory. --user (or YOURNAL_USER) selects that user's
+journal and tasks instead of the shared ones. Exit status is 0 on success and 1 on failure.
+"""
+import argparse
+import getpass
+import os
+import sqlite3
+import sys
+
+from . import router
+from .journal import Journal
+from .tasks import RECURRENCES, TaskList
+from .transfer import FORMATS
+
+
+def fail(message):
+    print(message, file=sys.stderr)
+    return 1
+
+
+# Entries
+
+def entries_add(args):
+    content = sys.stdin.read() if args.content == '-' else args.content
+    message = Journal().add_new_entry(args.title, content, args.mood)
+    print(message)
+    return 0 if message.startswith("Entry #") else 1
+
+
+def entries_list(args):
+    journal = Journal()
+    rows = journal.iter_entries(args.after, ('number', 'date', 'mood', 'title'))
+    for count, (number, entry_date, mood, title) in enumerate(rows):
+        if args.limit is not None and count == args.limit:
+            break
+        print(f"#{number}\t{entry_date}\t{mood or '-'}\t{title}")
+    return 0
+
+
+def entries_search(args):
+    for entry_id, number, title, snippet in Journal().search(args.query, args.limit):
+        print(f"#{number}\t{title}\t{snippet}")
+    return 0
+
+
+def entries_export(args):
+    count = Journal().export_entries(args.file, args.format)
+    if args.file != '-':
+        print(f"Exported {count} entries.")
+    return 0
+
+
+def entries_import(args):
+    try:
+        count = Journal().import_entries(args.file, args.format)
+    except (OSError, ValueError, KeyError) as e:
+        return fail(f"Import failed: {e}")
+    print(f"Imported {count} entries.")
+    return 0
+
+
+# Tasks
+
+def tasks_list(args):
+    task_list = TaskList()
+    if args.next is not None:
+        rows = task_list.next_tasks(args.next)
+    elif args.overdue:
+        rows = task_list.overdue_tasks()
+    else:
+        rows = task_list.task_rows()
+    for task_id, description, done, priority, due_date, recurrence, streak, longest in rows:
+        details = [f"priority {priority}"] if priority else []
+        if due_date:
+            details.append(f"due {due_date}")
+        if recurrence:
+            details.append(f"{recurrence}, streak {streak} (best {longest})")
+        print(f"{task_id}\t[{'X' if done else ' '}] {description}" + (f"\t{', '.join(details)}" if details else ""))
+    return 0
+
+
+def tasks_add(args):
+    try:
+        task_id = TaskList().add_task(args.description, args.priority, args.due, args.repeat)
+    except ValueError as e:
+        return fail(f"Invalid task: {e}")
+    print(task_id)
+    return 0
+
+
+def tasks_complete(args):
+    """Complete the tasks picked by id, description match or overdue status, in one transaction."""
+    task_list = TaskList()
+    task_ids = set(args.ids)
+    if args.match:
+        needle = args.match.lower()
+        task_ids.update(task.id for task in task_list.tasks if needle in task.description.lower())
+    if args.overdue:
+        task_ids.update(row[0] for row in task_list.overdue_tasks())
+    indices = task_list.indices_of(task_ids)
+    if not indices:
+        return fail("No matching tasks.")
+    task_list.complete_tasks(indices)
+    print(f"Completed {len(indices)} tasks.")
+    return 0
+
+
+def tasks_export(args):
+    count = TaskList().export_tasks(args.file, args.format)
+    if args.file != '-':
+        print(f"Exported {count} tasks.")
+    return 0
+
+
+def tasks_import(args):
+    try:
+        count = TaskList().import_tasks(args.file, args.format)
+    except (OSError, ValueError, KeyError) as e:
+        return fail(f"Import failed: {e}")
+    print(f"Imported {count} tasks.")
+    return 0
+
+
+# Users
+
+def read_password(args, prompt="Password: "):
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip('\n')
+    return getpass.getpass(prompt)
+
+
+def users_add(args):
+    from . import users
+    if not users.register_user(args.username, read_password(args)):
+        return fail(f"User '{args.username}' already exists, or differs from an existing one only in case.")
+    print(f"User {args.username} registered.")
+    return 0
+
+
+def users_list(args):
+    from . import users
+    for username, encrypted_password in users.list_users():
+        print(username)
+    return 0
+
+
+def users_check(args):
+    from . import users
+    password_ok = users.check_password(args.username, read_password(args))
+    if password_ok is None:
+        return fail(f"User '{args.username}' does not exist.")
+    return 0 if password_ok else fail("Wrong password.")
+
+
+def users_passwd(args):
+    from . import users
+    if not users.change_password(args.username, read_password(args, "New password: ")):
+        return fail(f"User '{args.username}' does not exist.")
+    print("Password changed.")
+    return 0
+
+
+def users_delete(args):
+    from . import users
+    if not users.delete_user(args.username):
+        return fail(f"User '{args.username}' does not exist.")
+    print(f"User {args.username} deleted.")
+    return 0
+
+
+def add_transfer_commands(commands, noun, export_func, import_func):
+    for name, func, help_text, file_help in (
+            ('export', export_func, f"write every one of the {noun}", "output file or folder, or - for stdout"),
+            ('import', import_func, f"add the {noun} of a file or folder", "input file or folder, or - for stdin")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('file', help=file_help)
+        command.add_argument('--format', choices=FORMATS,
+                             help="default: markdown for a folder, csv for .csv, otherwise jsonl")
+        command.set_defaults(func=func)
+
+
+def users_split_shared(args):
+    """Move the shared journal.db and tasks.db to the user's own folder."""
+    from . import users
+    if not users.user_exists(args.username):
+        return fail(f"User '{args.username}' does not exist.")
+    moved = router.split_shared_databases(args.username)
+    print(f"Moved {', '.join(moved)} to {router.user_directory(args.username)}." if moved
+          else "Nothing to move.")
+    return 0
+
+
+# Sync
+
+def sync_copies(args):
+    """Sync the journal and the tasks with another copy, printing what each exchanged."""
+    for name, store_class in (('journal', Journal), ('tasks', TaskList)):
+        if args.only not in (None, name):
+            continue
+        try:
+            result = store_class().sync(args.peer, args.token)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            return fail(f"Syncing the {name} failed: {e}")
+        print(f"{name}: pulled {result.pulled}, pushed {result.pushed} changes ({result.bytes} bytes)")
+    return 0
+
+
+def new_site(args):
+    """Give copied journal and tasks files their own site ids, so they can sync with the originals."""
+    for name, store_class in (('journal', Journal), ('tasks', TaskList)):
+        if args.only not in (None, name):
+            continue
+        try:
+            site_id = store_class().new_sync_site()
+        except sqlite3.Error as e:
+            return fail(f"Renewing the {name}'s site id failed: {e}")
+        print(f"{name}: new site id {site_id}")
+    return 0
+
+
+def serve_copies(args):
+    from .sync import serve
+    try:
+        server = serve(args.host, args.port, args.token)
+    except (OSError, ValueError) as e:
+        return fail(f"Cannot serve: {e}")
+    print(f"Serving the journal and tasks for sync on http://{args.host}:{server.server_port}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m yournal', description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', help="directory holding journal.db, tasks.db and users.db")
+    parser.add_argument('--user', help=f"use this user's journal and tasks (default: ${router.USER_ENV})")
+    groups = parser.add_subparsers(dest='group', required=True)
+
+    entries = groups.add_parser('entries', help="journal entries").add_subparsers(dest='command', required=True)
+    command = entries.add_parser('add', help="add an entry")
+    command.add_argument('title')
+    command.add_argument('content', help="entry text, or - to read it from stdin")
+    command.add_argument('--mood')
+    command.set_defaults(func=entries_add)
+    command = entries.add_parser('list', help="list entries in number order")
+    command.add_argument('--after', type=int, default=0, help="start after this entry number")
+    command.add_argument('--limit', type=int)
+    command.set_defaults(func=entries_list)
+    command = entries.add_parser('search', help="full-text search, best match first")
+    command.add_argument('query')
+    command.add_argument('--limit', type=int, default=Journal.SEARCH_LIMIT)
+    command.set_defaults(func=entries_search)
+    add_transfer_commands(entries, 'entries', entries_export, entries_import)
+
+    tasks = groups.add_parser('tasks', help="tasks and recurring goals").add_subparsers(dest='command', required=True)
+    command = tasks.add_parser('list', help="list tasks")
+    view = command.add_mutually_exclusive_group()
+    view.add_argument('--next', type=int, metavar='N', help="only the N open tasks to do next")
+    view.add_argument('--overdue', action='store_true', help="only open tasks past their due date")
+    command.set_defaults(func=tasks_list)
+    command = tasks.add_parser('add', help="add a task")
+    command.add_argument('description')
+    command.add_argument('--priority', type=int, default=0)
+    command.add_argument('--due', help="due date, YYYY-MM-DD")
+    command.add_argument('--repeat', choices=RECURRENCES)
+    command.set_defaults(func=tasks_add)
+    command = tasks.add_parser('complete', help="complete (or check in) tasks in bulk")
+    command.add_argument('ids', type=int, nargs='*', help="task ids")
+    command.add_argument('--match', help="also every task whose description contains this text")
+    command.add_argument('--overdue', action='store_true', help="also every overdue task")
+    command.set_defaults(func=tasks_complete)
+    add_transfer_commands(tasks, 'tasks', tasks_export, tasks_import)
+
+    users = groups.add_parser('users', help="login panel users").add_subparsers(dest='command', required=True)
+    for name, func, help_text in (('add', users_add, "register a user"),
+                                  ('check', users_check, "exit 0 if the password is right"),
+                                  ('passwd', users_passwd, "change a user's password")):
+        command = users.add_parser(name, help=help_text)
+        command.add_argument('username')
+        command.add_argument('--password-stdin', action='store_true', help="read the password from stdin")
+        command.set_defaults(func=func)
+    command = users.add_parser('list', help="list usernames")
+    command.set_defaults(func=users_list)
+    command = users.add_parser('delete', help="remove a user")
+    command.add_argument('username')
+    command.set_defaults(func=users_delete)
+    command = users.add_parser('split-shared', help="give the shared journal and tasks to a user")
+    command.add_argument('username')
+    command.set_defaults(func=users_split_shared)
+
+    command = groups.add_parser('sync', help="exchange changes with another copy")
+    command.add_argument('peer', help="folder holding the other journal.db and tasks.db, or a `serve` URL")
+    command.add_argument('--only', choices=('journal', 'tasks'))
+    command.add_argument('--token', help="the server's shared token (default: $YOURNAL_SYNC_TOKEN)")
+    command.set_defaults(func=sync_copies)
+    command = groups.add_parser('new-site', help="make copied databases a separate copy for sync")
+    command.add_argument('--only', choices=('journal', 'tasks'))
+    command.set_defaults(func=new_site)
+    command = groups.add_parser('serve', help="let other copies sync with this one over HTTP")
+    command.add_argument('--host', default='127.0.0.1',
+                         help="address to listen on (default: %(default)s); others need a token")
+    command.add_argument('--port', type=int, default=8765)
+    command.add_argument('--token', help="shared token peers must send (default: $YOURNAL_SYNC_TOKEN)")
+    command.set_defaults(func=serve_copies)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.dir:
+        os.chdir(args.dir)
+    if args.user:
+        from . import users
+        if not users.user_exists(args.user):
+            return fail(f"User '{args.user}' does not exist.")
+        router.set_user(args.user)
+    return args.func(args)
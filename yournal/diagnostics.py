@@ -0,0 +1,68 @@
+"""Dialog showing the data recorded by yournal.instrumentation."""
+from PyQt5.QtWidgets import QDialog, QFileDialog, QHBoxLayout, QMessageBox, QPushButton, QTextEdit, QVBoxLayout
+from PyQt5.QtGui import QFont
+
+from . import instrumentation
+
+
+class DiagnosticsDialog(QDialog):
+    """Per-method latencies, statement counts and slow queries, with JSON export."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(760, 480)
+        layout = QVBoxLayout(self)
+
+        self.report = QTextEdit(self)
+        self.report.setReadOnly(True)
+        self.report.setFont(QFont("Courier", 10))
+        self.report.setLineWrapMode(QTextEdit.NoWrap)
+        layout.addWidget(self.report)
+
+        buttons = QHBoxLayout()
+        for label, slot in (("Refresh", self.refresh), ("Reset", self.reset),
+                            ("Export JSON", self.export), ("Close", self.accept)):
+            button = QPushButton(label, self)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    def refresh(self):
+        self.report.setPlainText(self.format(instrumentation.snapshot()))
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Diagnostics", "diagnostics.json", "JSON (*.json)")
+        if path:
+            try:
+                instrumentation.export(path)
+            except OSError as e:
+                QMessageBox.warning(self, "Export Failed", str(e))
+
+    def format(self, data):
+        if not data['enabled'] and not data['methods']:
+            return (f"Instrumentation is off. Start the app with {instrumentation.ENV_VAR}=1 "
+                    "to record method latencies and SQL statements.")
+        lines = [f"{'Method':<34} {'Calls':>7} {'Mean ms':>9} {'p95 ms<=':>9} {'Max ms':>9} "
+                 f"{'Stmts/call':>10} {'Rows chg':>9} {'Rows ret':>9}"]
+        for name, stats in data['methods'].items():
+            p95 = stats['p95_ms_at_most']
+            lines.append(
+                f"{name:<34} {stats['calls']:>7} {stats['mean_ms']:>9.2f} "
+                f"{'-' if p95 is None else p95:>9} {stats['max_ms']:>9.2f} "
+                f"{stats['statements'] / stats['calls']:>10.1f} {stats['rows_changed']:>9} {stats['rows_returned']:>9}"
+            )
+        lines += ["", f"Calls slower than {data['slow_call_ms']} ms (latest last):"]
+        for call in data['slow_calls']:
+            lines.append(f"  {call['method']}: {call['ms']:.1f} ms, {call['statements']} statements")
+            for query in call['plans']:
+                lines.append(f"    {query['sql'][:120]}")
+                lines += [f"      {step}" for step in query['plan']]
+        if not data['slow_calls']:
+            lines.append("  None")
+        return "\n".join(lines)
@@ -0,0 +1,223 @@
+"""Opt-in timing of the storage classes, for finding where the time goes.
+
+Start an app with YOURNAL_INSTRUMENT=1 (or call enable() before the stores are
+created) to record, per method of every @instrumented class:
+
+- a latency histogram,
+- the SQL statements each call ran, counted through the connection's trace callback
+  (trigger bodies included),
+- the rows each call changed (connection.total_changes, so trigger writes too) and
+  returned (the length of a list or tuple result),
+- the calls slower than SLOW_CALL_MS, with the EXPLAIN QUERY PLAN of their statements.
+
+When disabled, no method is wrapped and no trace callback is set, so nothing is added
+to any call.
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+ENV_VAR = 'YOURNAL_INSTRUMENT'
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)  # Upper bounds
+SLOW_CALL_MS = 50.0
+SLOW_CALLS_KEPT = 50
+STATEMENTS_EXPLAINED = 10  # Per slow call
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+enabled = False
+_classes = []  # Every @instrumented class, wrapped on enable()
+_originals = {}  # (class, name) -> the method replaced by its wrapper
+_lock = threading.Lock()
+_local = threading.local()  # calls: stack of the calls running on this thread
+_stats = {}  # 'Class.method' -> MethodStats
+_slow_calls = []
+
+
+class MethodStats:
+    """Running totals and latency histogram of one method."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.statements = 0
+        self.rows_changed = 0
+        self.rows_returned = 0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)  # The last one counts calls over the largest bound
+
+    def add(self, elapsed_ms, call):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.statements += call.statements
+        self.rows_changed += call.rows_changed
+        self.rows_returned += call.rows_returned
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls (None past the last bound)."""
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + (None,), self.buckets):
+            seen += count
+            if seen >= target:
+                return bound
+        return None
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.calls if self.calls else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms_at_most': self.percentile(0.5),
+            'p95_ms_at_most': self.percentile(0.95),
+            'statements': self.statements,
+            'rows_changed': self.rows_changed,
+            'rows_returned': self.rows_returned,
+            'histogram': {f'<={bound}ms': count for bound, count in zip(BUCKETS_MS, self.buckets)}
+                         | {f'>{BUCKETS_MS[-1]}ms': self.buckets[-1]},
+        }
+
+
+class Call:
+    """What one running method call has done so far."""
+
+    def __init__(self):
+        self.statements = 0
+        self.sql = {}  # The first distinct statements, kept for EXPLAIN QUERY PLAN
+        self.rows_changed = 0
+        self.rows_returned = 0
+
+
+def instrumented(cls):
+    """Class decorator: time the public methods of `cls` while instrumentation is enabled."""
+    _classes.append(cls)
+    if enabled:
+        _wrap(cls)
+    return cls
+
+
+def enable(slow_call_ms=None):
+    """Start recording; affects connections opened from now on."""
+    global enabled, SLOW_CALL_MS
+    if slow_call_ms is not None:
+        SLOW_CALL_MS = slow_call_ms
+    if not enabled:
+        enabled = True
+        for cls in _classes:
+            _wrap(cls)
+
+
+def disable():
+    """Stop recording and restore the original methods; the data so far is kept."""
+    global enabled
+    enabled = False
+    for (cls, name), method in _originals.items():
+        setattr(cls, name, method)
+    _originals.clear()
+
+
+def attach(conn):
+    """Count the statements run on `conn`; called by yournal.storage for each new connection."""
+    if enabled:
+        conn.set_trace_callback(_trace)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _slow_calls.clear()
+
+
+def snapshot():
+    """The data recorded so far, as a JSON-serialisable dict."""
+    with _lock:
+        return {
+            'enabled': enabled,
+            'slow_call_ms': SLOW_CALL_MS,
+            'methods': {name: stats.as_dict() for name, stats in sorted(_stats.items())},
+            'slow_calls': list(_slow_calls),
+        }
+
+
+def export(path):
+    """Write snapshot() to `path` as JSON."""
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(snapshot(), output, indent=2)
+
+
+def _wrap(cls):
+    import inspect  # Slow to import, and only needed once instrumentation is on
+
+    for name, method in list(vars(cls).items()):
+        if (name.startswith('_') or not inspect.isfunction(method) or inspect.isgeneratorfunction(method)
+                or (cls, name) in _originals):
+            continue
+        _originals[cls, name] = method
+        setattr(cls, name, _timed(f'{cls.__name__}.{name}', method))
+
+
+def _timed(name, method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        conn = getattr(self, 'conn', None)
+        changes = conn.total_changes if conn is not None else 0
+        calls = _local.__dict__.setdefault('calls', [])
+        call = Call()
+        calls.append(call)
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            calls.pop()
+            if conn is not None:
+                call.rows_changed = conn.total_changes - changes
+        if isinstance(result, (list, tuple)):
+            call.rows_returned = len(result)
+        slow = elapsed_ms >= SLOW_CALL_MS and _slow_call(name, elapsed_ms, call, conn)
+        with _lock:
+            _stats.setdefault(name, MethodStats()).add(elapsed_ms, call)
+            if slow:
+                _slow_calls.append(slow)
+                del _slow_calls[:-SLOW_CALLS_KEPT]
+        return result
+    return wrapper
+
+
+def _trace(statement):
+    if getattr(_local, 'explaining', False):
+        return
+    for call in getattr(_local, 'calls', ()):  # Nested calls all count the statement
+        call.statements += 1
+        if len(call.sql) < STATEMENTS_EXPLAINED and statement.lstrip().upper().startswith(EXPLAINABLE):
+            call.sql[statement] = None  # Skips the '-- TRIGGER' lines traced for trigger bodies
+
+
+def _slow_call(name, elapsed_ms, call, conn):
+    """Describe a slow call, with the query plans of the distinct statements it ran."""
+    plans = {}
+    _local.explaining = True
+    try:
+        for statement in call.sql if conn is not None else ():
+            try:
+                plans[statement] = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement)]
+            except Exception as e:  # e.g. a statement tied to a temporary table that is gone
+                plans[statement] = [f'(no plan: {e})']
+    finally:
+        _local.explaining = False
+    return {
+        'method': name,
+        'ms': elapsed_ms,
+        'statements': call.statements,
+        'rows_changed': call.rows_changed,
+        'plans': [{'sql': sql[:500], 'plan': plan} for sql, plan in plans.items()],
+    }
+
+
+if os.environ.get(ENV_VAR, '').lower() in ('1', 'true', 'yes'):
+    enable()
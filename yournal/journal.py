@@ -0,0 +1,437 @@
+"""Journal entries stored in journal.db, shared by Journal.py, Journal_M.py and the command line.
+
+Each logged-in user has their own journal.db; see yournal.router.
+"""
+import sqlite3
+import time
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+from . import router, storage
+from .instrumentation import instrumented
+from .migrations import JOURNAL_MIGRATIONS, MOOD_ROLLUP_TABLES
+
+
+class EntryCache:
+    """Thread-safe LRU cache of full entry rows, looked up by id or by number.
+
+    Every discard or clear bumps `generation`. A reader notes it before reading a row
+    from the database and passes it to put(), which drops the row if a write has
+    discarded entries since, as the row may predate that write.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()  # id -> entry, least recently used first
+        self.ids = {}  # number -> id of the cached entries
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, entry_id):
+        with self.lock:
+            entry = self.entries.get(entry_id)
+            if entry is not None:
+                self.entries.move_to_end(entry_id)
+            return entry
+
+    def get_by_number(self, entry_number):
+        with self.lock:
+            entry_id = self.ids.get(entry_number)
+        return None if entry_id is None else self.get(entry_id)
+
+    def put(self, entry, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[entry[0]] = entry
+            self.entries.move_to_end(entry[0])
+            self.ids[entry[1]] = entry[0]
+            if len(self.entries) > self.size:
+                evicted = self.entries.popitem(last=False)[1]
+                self.ids.pop(evicted[1], None)
+
+    def discard_number(self, entry_number):
+        with self.lock:
+            entry_id = self.ids.pop(entry_number, None)
+            self.entries.pop(entry_id, None)
+            self.generation += 1
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.ids.clear()
+
+
+_caches = {}  # Database path -> EntryCache shared by every Journal on that file
+_caches_lock = threading.Lock()
+
+
+@instrumented
+class Journal:
+    DB_FILE = 'journal.db'
+    CACHE_SIZE = 256  # Full entries kept in memory
+    ENTRY_COLUMNS = ('id', 'number', 'title', 'content', 'mood', 'date', 'created_at')
+    LIST_COLUMNS = ('id', 'number', 'title', 'mood', 'date', 'preview')  # Enough to label a list row
+    PREVIEW_LENGTH = 80
+    PAGE_SIZE = 200
+    SEARCH_LIMIT = 50
+    TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"  # ISO-8601, sorts chronologically as text
+    HIGHLIGHT = ('[', ']')  # Marks matched terms in search snippets
+    MOOD_BUCKETS = MOOD_ROLLUP_TABLES  # Histogram bucket -> rollup table
+
+    def __init__(self, username=None):
+        self.path = router.database_path(Journal.DB_FILE, username)  # The current user's, by default
+        self.conn = self.create_connection()
+        with _caches_lock:
+            self.cache = _caches.setdefault(os.path.abspath(self.path), EntryCache(Journal.CACHE_SIZE))
+
+    def create_connection(self):
+        """Get the shared database connection, migrated to the current schema."""
+        try:
+            return storage.connect(self.path, JOURNAL_MIGRATIONS)
+        except sqlite3.Error as e:
+            print(f"Error connecting to database: {e}")
+        return None
+
+    def add_new_entry(self, title, content, mood=None):
+        """Add a new journal entry."""
+        now = time.localtime()
+        entry_date = time.strftime("%d-%m-%Y", now)
+        created_at = time.strftime(Journal.TIMESTAMP_FORMAT, now)
+        entry_number = self.get_next_entry_number()
+
+        if entry_number:
+            try:
+                with self.conn:
+                    self.conn.execute('''
+                        INSERT INTO journal_entries (number, title, content, mood, date, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (entry_number, title, content, mood, entry_date, created_at))
+                return f"Entry #{entry_number} added successfully."
+            except sqlite3.Error as e:
+                return f"Error saving entry to the database: {e}"
+        else:
+            return "Failed to determine next entry number."
+
+    def get_next_entry_number(self):
+        """Get the next available entry number from the database."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT MAX(number) FROM journal_entries')
+            result = cursor.fetchone()
+            return (result[0] or 0) + 1
+        except sqlite3.Error as e:
+            print(f"Error retrieving entry count: {e}")
+            return None
+
+    def get_all_entries(self, columns=ENTRY_COLUMNS):
+        """Get all journal entries; pass LIST_COLUMNS to leave out their full content."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f'SELECT {self._column_list(columns)} FROM journal_entries ORDER BY number')
+            rows = cursor.fetchall()
+            return rows
+        except sqlite3.Error as e:
+            return []
+
+    def get_entry(self, entry_id):
+        """Get a full journal entry by its id, from the cache when possible."""
+        entry = self.cache.get(entry_id)
+        if entry is not None:
+            return entry
+        generation = self.cache.generation
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f'SELECT {self._column_list(Journal.ENTRY_COLUMNS)} FROM journal_entries WHERE id = ?', (entry_id,)
+            )
+            entry = cursor.fetchone()
+        except sqlite3.Error as e:
+            return None
+        if entry is not None:
+            self.cache.put(entry, generation)
+        return entry
+
+    def get_entry_by_number(self, entry_number, columns=ENTRY_COLUMNS):
+        """Get a specific journal entry by its number; full entries come from the cache when possible."""
+        if columns == Journal.ENTRY_COLUMNS:
+            entry = self.cache.get_by_number(entry_number)
+            if entry is not None:
+                return entry
+        generation = self.cache.generation
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                f'SELECT {self._column_list(columns)} FROM journal_entries WHERE number = ?', (entry_number,)
+            )
+            entry = cursor.fetchone()
+        except sqlite3.Error as e:
+            return None
+        if entry is not None and columns == Journal.ENTRY_COLUMNS:
+            self.cache.put(entry, generation)
+        return entry
+
+    def forget(self, entry_number=None):
+        """Drop cached entries a write changes (all of them without a number).
+
+        Called inside the write's transaction: the entry is dropped right away and again
+        after the commit. A reader that read the old row before the commit then finds
+        the cache's generation changed and does not cache it.
+        """
+        if entry_number is None:
+            discard = self.cache.clear
+        else:
+            def discard():
+                self.cache.discard_number(entry_number)
+        discard()
+        self.conn.after_commit(discard)
+
+    def get_entries_page(self, after_number=0, limit=PAGE_SIZE, columns=ENTRY_COLUMNS):
+        """Get up to `limit` entries numbered after `after_number`, in number order.
+
+        Pass the number of the last row of one page as `after_number` to get the next.
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                SELECT {self._column_list(columns)} FROM journal_entries
+                WHERE number > ?
+                ORDER BY number
+                LIMIT ?
+            ''', (after_number, limit))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            return []
+
+    def iter_entries(self, after_number=0, columns=ENTRY_COLUMNS):
+        """Yield entries in number order straight from the cursor, one row at a time."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(f'''
+                SELECT {self._column_list(columns)} FROM journal_entries
+                WHERE number > ?
+                ORDER BY number
+            ''', (after_number,))
+            yield from cursor
+        except sqlite3.Error as e:
+            print(f"Error reading entries: {e}")
+        finally:
+            cursor.close()
+
+    def mood_histogram(self, start, end, bucket='day'):
+        """Get (bucket, mood, count) rows for the days or weeks between `start` and `end`.
+
+        `start` and `end` are dates or YYYY-MM-DD strings, both inclusive; weeks are
+        keyed by the date of their Monday, and the week containing `start` is included.
+        Only the rollup tables are read.
+        """
+        if bucket not in Journal.MOOD_BUCKETS:
+            raise ValueError(f"Unknown mood histogram bucket: {bucket}")
+        if bucket == 'week':  # Its key is the Monday before a mid-week start
+            start = datetime.date.fromisoformat(str(start)[:10])
+            start -= datetime.timedelta(days=start.weekday())
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                SELECT bucket, mood, count FROM {Journal.MOOD_BUCKETS[bucket]}
+                WHERE bucket BETWEEN ? AND ?
+                ORDER BY bucket, mood
+            ''', (str(start), str(end)))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading mood histogram: {e}")
+            return []
+
+    def entries_between(self, start, end, columns=ENTRY_COLUMNS):
+        """Get entries written from `start` up to but not including `end`, oldest first.
+
+        `start` and `end` are dates, datetimes or ISO-8601 strings.
+        """
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(f'''
+                SELECT {self._column_list(columns)} FROM journal_entries
+                WHERE created_at >= ? AND created_at < ?
+                ORDER BY created_at
+            ''', (self._timestamp(start), self._timestamp(end)))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading entries by date: {e}")
+            return []
+
+    def on_this_day(self, day=None, columns=ENTRY_COLUMNS):
+        """Get the entries written on the same day and month as `day` (default today) in earlier years."""
+        day = day or datetime.date.today()
+        try:
+            first = self.conn.execute('SELECT MIN(created_at) FROM journal_entries').fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Error reading entries by date: {e}")
+            return []
+        if not first:
+            return []
+        entries = []
+        for year in range(day.year - 1, int(first[:4]) - 1, -1):  # Newest year first
+            try:
+                past_day = day.replace(year=year)
+            except ValueError:  # 29 February in a non-leap year
+                continue
+            entries.extend(self.entries_between(past_day, past_day + datetime.timedelta(days=1), columns))
+        return entries
+
+    @staticmethod
+    def _timestamp(value):
+        """Format a date or datetime as an ISO-8601 string comparable with created_at."""
+        if isinstance(value, datetime.datetime):
+            return value.strftime(Journal.TIMESTAMP_FORMAT)
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return value
+
+    def save_draft(self, key, title, content, mood=None):
+        """Save the unsaved text of an editor dialog, replacing its previous draft."""
+        try:
+            with self.conn:
+                self.conn.execute('''
+                    INSERT INTO drafts (key, title, content, mood, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        title = excluded.title, content = excluded.content,
+                        mood = excluded.mood, updated_at = excluded.updated_at
+                ''', (key, title, content, mood, time.strftime(Journal.TIMESTAMP_FORMAT, time.localtime())))
+        except sqlite3.Error as e:
+            print(f"Error saving draft: {e}")
+
+    def get_draft(self, key):
+        """Get the (title, content, mood) draft saved for an editor dialog, or None."""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT title, content, mood FROM drafts WHERE key = ?', (key,))
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            return None
+
+    def delete_draft(self, key):
+        """Drop the draft of an editor dialog once its entry is saved."""
+        try:
+            with self.conn:
+                self.conn.execute('DELETE FROM drafts WHERE key = ?', (key,))
+        except sqlite3.Error as e:
+            print(f"Error deleting draft: {e}")
+
+    def import_entries(self, path, fmt=None, progress=None):
+        """Bulk-add the entries of a JSONL/CSV file or Markdown folder; see yournal.transfer."""
+        from . import transfer
+        return transfer.import_entries(self, path, fmt, progress)
+
+    def export_entries(self, path, fmt=None, progress=None):
+        """Write every entry to a JSONL/CSV file or Markdown folder; see yournal.transfer."""
+        from . import transfer
+        return transfer.export_entries(self, path, fmt, progress)
+
+    def sync(self, location, token=None):
+        """Exchange changes with another copy: a folder or a sync server URL; see yournal.sync."""
+        from . import sync
+        peer = sync.open_peer(location, 'journal_entries', token)
+        try:
+            result = sync.sync(self.conn, 'journal_entries', peer)
+        finally:
+            peer.close()
+        if result.pulled:
+            self.forget()
+        return result
+
+    def new_sync_site(self):
+        """Give this copy, made from an already synced file, its own site id; see yournal.sync.new_site."""
+        from . import sync
+        return sync.new_site(self.conn, 'journal_entries')
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Find entries matching every word of `query`, best match first.
+
+        Returns (id, number, title, snippet) rows; each word also matches as a prefix,
+        so results can be refreshed as the user types.
+        """
+        match = self._match_expression(query)
+        if not match:
+            return []
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT e.id, e.number, e.title,
+                       snippet(journal_entries_fts, -1, ?, ?, '...', 12)
+                FROM journal_entries_fts
+                JOIN journal_entries AS e ON e.id = journal_entries_fts.rowid
+                WHERE journal_entries_fts MATCH ?
+                ORDER BY bm25(journal_entries_fts, 2.0, 1.0)
+                LIMIT ?
+            ''', (*Journal.HIGHLIGHT, match, limit))
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            print(f"Error searching entries: {e}")
+            return []
+
+    @staticmethod
+    def _match_expression(query):
+        """Turn free text into an FTS5 query of quoted prefix terms."""
+        terms = ['"' + word.replace('"', '""') + '"*' for word in query.split()]
+        return ' '.join(terms)
+
+    @classmethod
+    def _column_list(cls, columns):
+        """Validate requested column names and join them for a SELECT.
+
+        Besides the table's own columns, 'preview' selects the first PREVIEW_LENGTH
+        characters of the content on one line.
+        """
+        unknown = [column for column in columns if column not in cls.ENTRY_COLUMNS + ('preview',)]
+        if unknown:
+            raise ValueError(f"Unknown journal entry columns: {', '.join(unknown)}")
+        preview = f"replace(substr(content, 1, {cls.PREVIEW_LENGTH}), char(10), ' ') AS preview"
+        return ', '.join(preview if column == 'preview' else column for column in columns)
+
+    def edit_entry(self, entry_number, new_title=None, new_content=None, new_mood=None):
+        """Edit the title, content, or mood of an existing entry; fields left as None are kept."""
+        try:
+            with self.conn:
+                self.conn.execute('''
+                    UPDATE journal_entries
+                    SET title = COALESCE(?, title), content = COALESCE(?, content), mood = COALESCE(?, mood)
+                    WHERE number = ?
+                ''', (new_title, new_content, new_mood, entry_number))
+                self.forget(entry_number)
+            return f"Entry #{entry_number} updated successfully."
+        except sqlite3.Error as e:
+            return f"Error updating entry: {e}"
+
+    def delete_entry(self, entry_number):
+        """Delete an entry by its number."""
+        try:
+            with self.conn:
+                self.conn.execute('DELETE FROM journal_entries WHERE number = ?', (entry_number,))
+                self.forget(entry_number)
+            # Numbers are allowed to have gaps; renumber_entries() compacts them later
+            return f"Entry #{entry_number} deleted successfully."
+        except sqlite3.Error as e:
+            return f"Error deleting entry: {e}"
+
+    def renumber_entries(self):
+        """Compact entry numbers left with gaps by deletions, in one transaction."""
+        try:
+            with self.conn:
+                # Only rows whose number actually changes are rewritten
+                self.conn.execute('''
+                    UPDATE journal_entries
+                    SET number = ranked.new_number
+                    FROM (
+                        SELECT id, ROW_NUMBER() OVER (ORDER BY number) AS new_number
+                        FROM journal_entries
+                    ) AS ranked
+                    WHERE journal_entries.id = ranked.id
+                      AND journal_entries.number != ranked.new_number
+                ''')
+                self.forget()  # Numbers have moved
+        except sqlite3.Error as e:
+            print(f"Error renumbering entries: {e}")
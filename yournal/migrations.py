@@ -0,0 +1,382 @@
+"""Versioned schema migrations for journal.db, tasks.db and users.db.
+
+Each database stores its schema version in PRAGMA user_version. A migration list
+holds one step per version; migrate() runs only the steps a database has not had
+yet, so an up-to-date database costs a single pragma read.
+"""
+
+BATCH_SIZE = 5000  # Rows rewritten per transaction by data migrations
+MOOD_ROLLUP_TABLES = {'day': 'mood_daily', 'week': 'mood_weekly'}
+SYNC_COLUMNS = {  # Columns copied between synced databases; ids and entry numbers stay local
+    'journal_entries': ('title', 'content', 'mood', 'date', 'created_at'),
+    'tasks': ('description', 'completed', 'priority', 'due_date', 'recurrence',
+              'current_streak', 'longest_streak', 'last_period'),
+}
+
+JOURNAL_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    number INTEGER,
+    title TEXT,
+    content TEXT,
+    mood TEXT,
+    date TEXT,
+    created_at TEXT
+'''
+
+
+class Superseded(Exception):
+    """Raised by run_in_batches when another connection finished the step between batches."""
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations):
+    """Run the migrations a database has not had yet, one transaction per version.
+
+    Each step takes the write lock up front (BEGIN IMMEDIATE) and reads the version
+    again under it, so connections opening a new database at once run each step once.
+    Returns the version the database had.
+    """
+    start = current = schema_version(conn)
+    while current < len(migrations):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = schema_version(conn)
+            if current < len(migrations):
+                migrations[current](conn)
+                current += 1
+                conn.execute(f'PRAGMA user_version = {current}')
+            conn.commit()
+        except Superseded:
+            conn.rollback()
+            current = schema_version(conn)
+        except Exception:
+            conn.rollback()
+            raise
+    return start
+
+
+def run_in_batches(conn, sql):
+    """Repeat an UPDATE/DELETE taking a LIMIT parameter until it touches less than a batch.
+
+    Commits between batches, so the statement must be safe to resume after an
+    interruption, and another connection may take over the step meanwhile; if it
+    finishes the step first, this raises Superseded.
+    """
+    version = schema_version(conn)
+    while conn.execute(sql, (BATCH_SIZE,)).rowcount == BATCH_SIZE:
+        conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        if schema_version(conn) != version:
+            raise Superseded()
+
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def change_log(conn, table):
+    """Give every row of `table` a global uid and log its changes for yournal.sync.
+
+    change_log keeps the latest change of each row, deletions included: its op, a
+    version counting the row's changes, a UTC timestamp, the site that made it and a
+    sequence number, which only grows, for the sync watermarks. The triggers skip
+    changes made while sync_meta's 'applying' is set, as the sync logs those itself.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_meta (
+            key TEXT PRIMARY KEY,
+            value
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        INSERT OR IGNORE INTO sync_meta
+        VALUES ('site_id', lower(hex(randomblob(16)))), ('applying', 0), ('shared', 0)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_peers (
+            site_id TEXT PRIMARY KEY,
+            pulled INTEGER NOT NULL DEFAULT 0,
+            pushed INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            row_uid TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            changed_at TEXT NOT NULL,
+            origin TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_seq ON change_log (seq)')
+
+    # Row uids are '<site id>-<local id>', the id zero-padded so that a copy's uids sort
+    # in id order: unique across copies, and appended to the uid indexes, unlike random
+    # uids. Every step below can run again, as run_in_batches commits part way.
+    site_id = "(SELECT value FROM sync_meta WHERE key = 'site_id')"
+    now = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+    if 'uid' not in table_columns(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN uid TEXT')
+    run_in_batches(conn, f'''
+        UPDATE {table} SET uid = printf('%s-%012d', {site_id}, id)
+        WHERE id IN (SELECT id FROM {table} WHERE uid IS NULL LIMIT ?)
+    ''')
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid)')
+    conn.execute(f'''
+        INSERT OR IGNORE INTO change_log (row_uid, seq, op, version, changed_at, origin)
+        SELECT uid, id, 'insert', 1, {now}, {site_id} FROM {table}
+    ''')
+
+    def log_change(op, uid):
+        return f'''
+            INSERT OR REPLACE INTO change_log (row_uid, seq, op, version, changed_at, origin)
+            VALUES ({uid}, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), '{op}',
+                    COALESCE((SELECT version FROM change_log WHERE row_uid = {uid}), 0) + 1, {now}, {site_id});
+        '''
+    not_applying = "(SELECT value FROM sync_meta WHERE key = 'applying') = 0"
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_log_insert AFTER INSERT ON {table} WHEN {not_applying} BEGIN
+            UPDATE {table} SET uid = printf('%s-%012d', {site_id}, new.id) WHERE id = new.id AND new.uid IS NULL;
+            {log_change('insert', f"(SELECT uid FROM {table} WHERE id = new.id)")}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_log_update AFTER UPDATE OF {', '.join(SYNC_COLUMNS[table])} ON {table}
+        WHEN {not_applying} BEGIN {log_change('update', 'new.uid')} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_log_delete AFTER DELETE ON {table}
+        WHEN {not_applying} BEGIN {log_change('delete', 'old.uid')} END
+    ''')
+
+
+# journal.db
+
+def journal_entries_table(conn):
+    """Create journal_entries, or rebuild it in the canonical column order.
+
+    Journal.py used to create the table without mood, so rows read positionally
+    differed depending on which app created the file.
+    """
+    columns = table_columns(conn, 'journal_entries')
+    if not columns:
+        conn.execute(f'CREATE TABLE journal_entries ({JOURNAL_COLUMNS})')
+    elif columns != ['id', 'number', 'title', 'content', 'mood', 'date', 'created_at']:
+        mood = 'mood' if 'mood' in columns else 'NULL'
+        created_at = 'created_at' if 'created_at' in columns else 'NULL'
+        conn.execute(f'CREATE TABLE journal_entries_new ({JOURNAL_COLUMNS})')
+        conn.execute(f'''
+            INSERT INTO journal_entries_new (id, number, title, content, mood, date, created_at)
+            SELECT id, number, title, content, {mood}, date, {created_at} FROM journal_entries
+        ''')
+        conn.execute('DROP TABLE journal_entries')
+        conn.execute('ALTER TABLE journal_entries_new RENAME TO journal_entries')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_entries_number ON journal_entries (number)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_entries_created_at ON journal_entries (created_at)')
+
+
+def journal_created_at(conn):
+    """Fill created_at from the DD-MM-YYYY date of entries written before it existed."""
+    run_in_batches(conn, '''
+        UPDATE journal_entries
+        SET created_at = substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-'
+                         || substr(date, 1, 2) || 'T00:00:00'
+        WHERE id IN (
+            SELECT id FROM journal_entries
+            WHERE created_at IS NULL AND date IS NOT NULL
+            LIMIT ?
+        )
+    ''')
+
+
+def journal_search_index(conn):
+    """Full-text index over titles and contents, kept in sync by triggers."""
+    for statement in (
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS journal_entries_fts USING fts5(
+               title, content, content='journal_entries', content_rowid='id'
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS journal_entries_fts_insert
+           AFTER INSERT ON journal_entries BEGIN
+               INSERT INTO journal_entries_fts (rowid, title, content)
+               VALUES (new.id, new.title, new.content);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS journal_entries_fts_delete
+           AFTER DELETE ON journal_entries BEGIN
+               INSERT INTO journal_entries_fts (journal_entries_fts, rowid, title, content)
+               VALUES ('delete', old.id, old.title, old.content);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS journal_entries_fts_update
+           AFTER UPDATE OF title, content ON journal_entries BEGIN
+               INSERT INTO journal_entries_fts (journal_entries_fts, rowid, title, content)
+               VALUES ('delete', old.id, old.title, old.content);
+               INSERT INTO journal_entries_fts (rowid, title, content)
+               VALUES (new.id, new.title, new.content);
+           END''',
+    ):
+        conn.execute(statement)
+    conn.execute("INSERT INTO journal_entries_fts (journal_entries_fts) VALUES ('rebuild')")
+
+
+def rollup_keys(row):
+    """SQL for the (day, week) rollup keys of a row; weeks are keyed by their Monday."""
+    day = f"substr({row}.created_at, 1, 10)"
+    return day, f"date({day}, '-6 days', 'weekday 1')"
+
+
+def journal_mood_rollups(conn):
+    """Per-day and per-week mood counts, kept up to date by triggers."""
+    for table in MOOD_ROLLUP_TABLES.values():
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket TEXT NOT NULL,
+                mood TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, mood)
+            ) WITHOUT ROWID
+        ''')
+    # Drop the date-keyed triggers earlier versions of the app created outside the migrations
+    for trigger in ('insert', 'delete', 'update_new', 'update_old'):
+        conn.execute(f'DROP TRIGGER IF EXISTS mood_rollup_{trigger}')
+    for row, delta, event in (('new', 1, 'insert'), ('old', -1, 'delete')):
+        changes = ''.join(f'''
+            INSERT INTO {table} (bucket, mood, count) VALUES ({key}, {row}.mood, {delta})
+            ON CONFLICT (bucket, mood) DO UPDATE SET count = count + {delta};
+            DELETE FROM {table} WHERE bucket = {key} AND mood = {row}.mood AND count <= 0;
+        ''' for key, table in zip(rollup_keys(row), MOOD_ROLLUP_TABLES.values()))
+        when = f"{row}.mood IS NOT NULL AND {row}.created_at IS NOT NULL"
+        conn.execute(f'''
+            CREATE TRIGGER mood_rollup_{event}
+            AFTER {event.upper()} ON journal_entries WHEN {when} BEGIN {changes} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER mood_rollup_update_{row}
+            AFTER UPDATE OF mood, created_at ON journal_entries WHEN {when} BEGIN {changes} END
+        ''')
+    for key, table in zip(rollup_keys('journal_entries'), MOOD_ROLLUP_TABLES.values()):
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'''
+            INSERT INTO {table} (bucket, mood, count)
+            SELECT {key}, mood, COUNT(*) FROM journal_entries
+            WHERE mood IS NOT NULL AND created_at IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+
+
+def journal_drafts(conn):
+    """Autosaved text of the entry editor dialogs, one row per dialog."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drafts (
+            key TEXT PRIMARY KEY,
+            title TEXT,
+            content TEXT,
+            mood TEXT,
+            updated_at TEXT
+        ) WITHOUT ROWID
+    ''')
+
+
+def journal_change_log(conn):
+    change_log(conn, 'journal_entries')
+
+
+JOURNAL_MIGRATIONS = [
+    journal_entries_table,
+    journal_created_at,
+    journal_search_index,
+    journal_mood_rollups,
+    journal_drafts,
+    journal_change_log,
+]
+
+
+# tasks.db
+
+def tasks_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT NOT NULL,
+            completed INTEGER NOT NULL
+        )
+    ''')
+
+
+def tasks_priority_due_date(conn):
+    """Priority (higher first) and an optional ISO due date, indexed for open-task queries."""
+    conn.execute('ALTER TABLE tasks ADD COLUMN priority INTEGER NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE tasks ADD COLUMN due_date TEXT')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_priority
+        ON tasks (completed, priority DESC, due_date)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_completed_due_date ON tasks (completed, due_date)')
+
+
+def tasks_recurrence(conn):
+    """Recurring goals: a rule, streaks kept up to date on each check-in, and the check-in history."""
+    conn.execute('ALTER TABLE tasks ADD COLUMN recurrence TEXT')  # NULL (one-off), 'daily' or 'weekly'
+    conn.execute('ALTER TABLE tasks ADD COLUMN current_streak INTEGER NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE tasks ADD COLUMN longest_streak INTEGER NOT NULL DEFAULT 0')
+    conn.execute('ALTER TABLE tasks ADD COLUMN last_period TEXT')  # Period of the latest check-in
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_completions (
+            task_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (task_id, period)
+        ) WITHOUT ROWID
+    ''')
+
+
+def tasks_change_log(conn):
+    change_log(conn, 'tasks')
+
+
+TASK_MIGRATIONS = [
+    tasks_table,
+    tasks_priority_due_date,
+    tasks_recurrence,
+    tasks_change_log,
+]
+
+
+# users.db
+
+def users_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password BLOB NOT NULL
+        )
+    ''')
+
+
+def users_username_key(conn):
+    """Make usernames unique regardless of case, through a case-folded copy of each one.
+
+    Names registered earlier that differ only in case keep working: the first one
+    registered gets the key, the others are left without one.
+    """
+    if 'username_key' not in table_columns(conn, 'users'):
+        conn.execute('ALTER TABLE users ADD COLUMN username_key TEXT')
+    taken = set()
+    for user_id, username in conn.execute('SELECT id, username FROM users ORDER BY id').fetchall():
+        key = username.casefold()
+        if key not in taken:
+            taken.add(key)
+            conn.execute('UPDATE users SET username_key = ? WHERE id = ?', (key, user_id))
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username_key ON users (username_key)
+        WHERE username_key IS NOT NULL
+    ''')
+
+
+USER_MIGRATIONS = [
+    users_table,
+    users_username_key,
+]
@@ -0,0 +1,99 @@
+"""Background music for the journal apps, played from a configured playlist."""
+import itertools
+import os
+import threading
+import time
+
+PLAYLIST_FILE = 'music.txt'  # One track path per line; blank lines and '#' comments are skipped
+PLAYLIST_ENV = 'YOURNAL_MUSIC'  # Overrides the playlist file with os.pathsep-separated paths
+SILENT_AUDIO_DRIVERS = ('dummy', 'disk')
+
+_mixer_lock = threading.Lock()  # pygame has one mixer; a new player waits for the last to fade out and quit it
+
+
+def configured_tracks():
+    """Read the playlist from $YOURNAL_MUSIC, or from music.txt if it is not set."""
+    value = os.environ.get(PLAYLIST_ENV)
+    if value is not None:
+        return [path for path in value.split(os.pathsep) if path]
+    try:
+        with open(PLAYLIST_FILE, encoding='utf-8') as playlist:
+            lines = [line.strip() for line in playlist]
+    except OSError:
+        return []
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+def headless():
+    """Whether there is nothing to play to, e.g. under the dummy SDL driver in tests."""
+    return (os.environ.get('SDL_AUDIODRIVER', '').lower() in SILENT_AUDIO_DRIVERS
+            or os.environ.get('QT_QPA_PLATFORM') == 'offscreen')
+
+
+class MusicPlayer:
+    """Streams a playlist with pygame on a background thread; each track fades in, and stop() fades out.
+
+    start() and stop() return at once; pygame is imported, the mixer set up and the
+    fade-out waited for on the player thread, so a window never waits on audio. With no playable tracks, no
+    audio device, or a headless session the player stays silent.
+    """
+    VOLUME = 0.5  # 0.0 to 1.0
+    FADE_MS = 2000
+    POLL_INTERVAL = 0.25  # Seconds between checks for the end of a track
+
+    def __init__(self, tracks=None):
+        self.tracks = configured_tracks() if tracks is None else list(tracks)
+        self.silent = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start playing in the background; does nothing if already started."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='music', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Fade out and stop playing; the fade finishes on the player thread."""
+        self.stopping.set()
+
+    def run(self):
+        with _mixer_lock:
+            if not self.stopping.is_set():
+                self.play()
+
+    def play(self):
+        tracks = [path for path in self.tracks if os.path.isfile(path)]
+        if not tracks or headless():
+            self.silent = True
+            return
+        try:
+            import pygame
+            pygame.mixer.init()
+        except Exception as e:  # No pygame, or no audio device
+            print(f"Music disabled: {e}")
+            self.silent = True
+            return
+
+        try:
+            failures = 0
+            for path in itertools.cycle(tracks):
+                if self.stopping.is_set() or failures == len(tracks):
+                    break
+                try:
+                    pygame.mixer.music.load(path)
+                    pygame.mixer.music.set_volume(MusicPlayer.VOLUME)
+                    pygame.mixer.music.play(fade_ms=MusicPlayer.FADE_MS)
+                except pygame.error as e:
+                    print(f"Error playing {path}: {e}")
+                    failures += 1
+                    continue
+                failures = 0
+                while pygame.mixer.music.get_busy() and not self.stopping.wait(MusicPlayer.POLL_INTERVAL):
+                    pass
+            if pygame.mixer.music.get_busy():
+                pygame.mixer.music.fadeout(MusicPlayer.FADE_MS)
+                time.sleep(MusicPlayer.FADE_MS / 1000)
+        finally:
+            self.silent = True
+            pygame.mixer.quit()
@@ -0,0 +1,99 @@
+"""Per-user journal.db and tasks.db files, resolved from the logged-in user.
+
+Each user's databases live in their own folder, USERS_DIR/<user id>/, so a user's
+queries only ever touch their own rows, and one user's writes never lock another
+user's files. With nobody logged in, the shared files in the working directory are
+used, as before. users.db stays shared: it is the list of who can log in.
+
+The login panel calls set_user() after a successful login; the command line and
+scripts can set YOURNAL_USER instead. Stores resolve their path when they are
+created; a window resolves its user once, with bound_user(), and creates all its
+stores for that user, so it keeps the databases it was opened with.
+"""
+import os
+import urllib.parse
+
+from . import storage, users
+
+USERS_DIR = 'user_data'
+USER_ENV = 'YOURNAL_USER'
+SHARDED_FILES = ('journal.db', 'tasks.db')
+SHARED = ''  # As a username: the shared databases, whoever is logged in
+
+_user = None
+
+
+def set_user(username):
+    """Route the stores created from now on to `username`'s databases, or the shared ones for None."""
+    global _user
+    _user = username or None
+
+
+def current_user():
+    return _user or os.environ.get(USER_ENV) or None
+
+
+def bound_user():
+    """The current user, or SHARED: a username that keeps naming the same databases after a log in or out."""
+    return current_user() or SHARED
+
+
+def user_directory(username):
+    """USERS_DIR/<the user's id in users.db>; raises ValueError if there is no such user.
+
+    Ids never change or get reused, so the folder is the user's alone, even on file
+    systems that ignore case. A folder named after the user, as earlier versions
+    made, is renamed to it.
+    """
+    user_id = users.user_id(username)
+    if user_id is None:
+        raise ValueError(f"User '{username}' does not exist")
+    directory = os.path.join(USERS_DIR, str(user_id))
+    named = os.path.join(USERS_DIR, urllib.parse.quote(username, safe='').replace('.', '%2E'))
+    if not os.path.exists(directory) and os.path.isdir(named):
+        os.replace(named, directory)
+    return directory
+
+
+def database_path(file_name, username=None):
+    """Where `file_name` lives for `username` (default: the current user), creating its folder."""
+    if username is None:
+        username = current_user()
+    if not username:  # Nobody logged in, or SHARED
+        return file_name
+    directory = user_directory(username)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, file_name)
+
+
+def split_shared_databases(username, file_names=SHARDED_FILES):
+    """Move the shared databases into `username`'s folder; returns the names of the files moved.
+
+    The shared files have no owner column, so all their rows go to one user; everyone
+    else starts with empty databases. Each file is copied with the SQLite backup API,
+    which includes what is still in its WAL, and the original is then renamed to
+    <name>.shared-backup. A file the user already has is left alone, so running this
+    again is harmless.
+    """
+    moved = []
+    for file_name in file_names:
+        target = database_path(file_name, username)
+        if not os.path.exists(file_name) or os.path.exists(target):
+            continue
+        storage.close(file_name)  # This thread's connection, if it has one, would keep the WAL open
+        source = storage.open_connection(file_name)
+        try:
+            destination = storage.open_connection(target + '.partial')
+            try:
+                source.backup(destination)
+            finally:
+                destination.close()
+        finally:
+            source.close()
+        os.replace(target + '.partial', target)
+        os.replace(file_name, file_name + '.shared-backup')
+        for suffix in ('-wal', '-shm'):  # Left empty by the last connection closing
+            if os.path.exists(file_name + suffix):
+                os.remove(file_name + suffix)
+        moved.append(file_name)
+    return moved
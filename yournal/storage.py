@@ -0,0 +1,122 @@
+"""Long-lived, tuned SQLite connections shared by the Yournal apps.
+
+connect() hands out one connection per database file and thread, opened on first
+use and kept until close() or close_all(). Every connection runs in WAL mode, so
+readers and the writer do not block each other, and its `with` blocks nest, so a
+caller can group several storage calls into one transaction.
+"""
+import os
+import sqlite3
+import threading
+
+from . import instrumentation
+from .migrations import migrate
+
+BUSY_TIMEOUT = 5.0  # Seconds to wait for another connection's write lock
+STATEMENT_CACHE_SIZE = 256  # Prepared statements kept per connection
+MMAP_SIZE = 256 * 1024 * 1024
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',  # Safe with WAL; only a power loss can drop the last commits
+    f'PRAGMA mmap_size = {MMAP_SIZE}',
+    'PRAGMA temp_store = MEMORY',
+)
+
+_local = threading.local()
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection whose `with` blocks nest.
+
+    The outermost block is one transaction, committed or rolled back on exit; inner
+    blocks become savepoints, so a failing inner block only undoes its own changes.
+    The transaction takes the write lock as it starts (BEGIN IMMEDIATE), waiting up to
+    BUSY_TIMEOUT for it: blocks that read before they write would otherwise fail at
+    once if another connection committed in between, as SQLite cannot wait there.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.depth = 0
+        self.commit_callbacks = []
+
+    def after_commit(self, callback):
+        """Call `callback` once the current transaction commits (right away outside one)."""
+        if self.depth:
+            self.commit_callbacks.append(callback)
+        else:
+            callback()
+
+    def __enter__(self):
+        if self.depth:
+            self.execute(f'SAVEPOINT level_{self.depth}')
+        elif not self.in_transaction:
+            self.execute('BEGIN IMMEDIATE')
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.depth -= 1
+        if not self.depth:
+            callbacks, self.commit_callbacks = self.commit_callbacks, []
+            super().__exit__(exc_type, exc_value, traceback)
+            if exc_type is None:
+                for callback in callbacks:
+                    callback()
+            return False
+        if exc_type is not None:
+            self.execute(f'ROLLBACK TO level_{self.depth}')
+        self.execute(f'RELEASE level_{self.depth}')
+        return False
+
+
+def _connections():
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    return _local.connections
+
+
+def configure(conn):
+    """Apply the shared pragmas to a connection."""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def open_connection(path, migrations=()):
+    """Open a new configured connection and migrate the database; the caller owns it."""
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE, factory=Connection
+    )
+    try:
+        configure(conn)
+        instrumentation.attach(conn)
+        if migrations:
+            migrate(conn, migrations)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def connect(path, migrations=()):
+    """Get this thread's connection to the database at `path`, opening it on first use."""
+    key = os.path.abspath(path)
+    connections = _connections()
+    if key not in connections:
+        connections[key] = open_connection(path, migrations)
+    return connections[key]
+
+
+def close(path):
+    """Close this thread's connection to the database at `path`, if it is open."""
+    conn = _connections().pop(os.path.abspath(path), None)
+    if conn is not None:
+        conn.close()
+
+
+def close_all():
+    """Close every connection this thread opened."""
+    connections = _connections()
+    while connections:
+        connections.popitem()[1].close()
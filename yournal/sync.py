@@ -0,0 +1,433 @@
+"""Incremental sync of journal.db and tasks.db between two copies, from their change logs.
+
+The migrations log the latest change of every row in change_log (see
+migrations.change_log). A sync pulls the peer's changes made after the last
+watermark, then pushes ours the same way; only changed rows travel, in batches of
+BATCH_SIZE, and the watermarks advance with each applied batch, so an interrupted
+sync picks up where it stopped.
+
+Conflicts are settled per row by comparing (version, changed_at, origin): the
+greater one wins, on both sides, whatever order they sync in. A deletion is a
+change like any other, so a later edit elsewhere brings the row back.
+
+Copies usually start as copies of whole files. Copied before the upgrade, each
+copy gives its rows its own uids when it migrates; a copy that has not shared any
+changes yet therefore takes over the peer's uids for rows holding the same values
+(see apply_changes), so a first sync matches them up instead of duplicating them.
+Rows that were changed on one side only keep both versions. Copied after the
+upgrade, the copy shares the original's site id; new_site() (`python -m yournal
+new-site`) gives it its own, after which it syncs as if it had been migrated alone.
+
+Peers are another database file (FilePeer) or a copy served over HTTP by serve()
+(HttpPeer), e.g. `python -m yournal serve` on the other machine. Both ends of an
+HTTP sync share a token, sent as a bearer token; the server only runs without
+one on a loopback address.
+"""
+import collections
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import router, storage
+from .migrations import JOURNAL_MIGRATIONS, SYNC_COLUMNS, TASK_MIGRATIONS
+
+BATCH_SIZE = 500  # Changes per request
+DEFAULT_PORT = 8765
+TOKEN_ENV = 'YOURNAL_SYNC_TOKEN'  # The shared token, if not given explicitly
+OPS = ('insert', 'update', 'delete')
+VALUE_TYPES = (str, int, float, type(None))  # What SQLite and JSON have in common
+TABLES = {  # Synced table -> (database file, migrations)
+    'journal_entries': ('journal.db', JOURNAL_MIGRATIONS),
+    'tasks': ('tasks.db', TASK_MIGRATIONS),
+}
+INSERT_VALUES = {  # Local-only columns filled in when a row arrives from a peer
+    'journal_entries': {'number': '(SELECT COALESCE(MAX(number), 0) + 1 FROM journal_entries)'},
+    'tasks': {},
+}
+
+SyncResult = collections.namedtuple('SyncResult', 'pulled pushed bytes')  # Changes applied here and there
+
+
+def site_id(conn):
+    return conn.execute("SELECT value FROM sync_meta WHERE key = 'site_id'").fetchone()[0]
+
+
+def shared(conn):
+    """Whether changes of this copy have gone to a peer, after which its uids must stay as they are."""
+    row = conn.execute("SELECT value FROM sync_meta WHERE key = 'shared'").fetchone()
+    if row is None:  # Migrated before 'shared' was kept
+        return conn.execute('SELECT 1 FROM sync_peers LIMIT 1').fetchone() is not None
+    return bool(row[0])
+
+
+def site(conn):
+    """What a peer needs to know about this copy before syncing with it."""
+    return {'site_id': site_id(conn), 'shared': shared(conn)}
+
+
+def new_site(conn, table):
+    """Give a copy of an already synced database its own site id; returns the new id.
+
+    The copy gets new uids for its rows, a fresh change log and no peers, as if it had
+    been migrated on its own, so its first sync matches its rows to the original's.
+    Run it right after copying: rows deleted in the copy before then come back.
+    """
+    with conn:
+        conn.execute("UPDATE sync_meta SET value = lower(hex(randomblob(16))) WHERE key = 'site_id'")
+        conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('shared', 0)")
+        conn.execute('DELETE FROM sync_peers')
+        conn.execute('DELETE FROM change_log')
+        local_site = site_id(conn)
+        conn.execute(f"UPDATE {table} SET uid = printf('%s-%012d', ?, id)", (local_site,))
+        conn.execute(f'''
+            INSERT INTO change_log (row_uid, seq, op, version, changed_at, origin)
+            SELECT uid, id, 'insert', 1, strftime('%Y-%m-%dT%H:%M:%fZ', 'now'), ? FROM {table}
+        ''', (local_site,))
+    return local_site
+
+
+def changes_since(conn, table, seq, exclude_origin=None, limit=BATCH_SIZE):
+    """The changes logged after `seq`, with the rows' current values, as a JSON-ready payload.
+
+    Changes made by `exclude_origin` (the peer asking) are left out, but still count
+    towards 'last_seq', the watermark to ask from next time.
+    """
+    columns = SYNC_COLUMNS[table]
+    rows = conn.execute(f'''
+        SELECT change_log.seq, change_log.row_uid, change_log.op, change_log.version,
+               change_log.changed_at, change_log.origin, {', '.join(f'{table}.{column}' for column in columns)}
+        FROM change_log LEFT JOIN {table} ON {table}.uid = change_log.row_uid
+        WHERE change_log.seq > ?
+        ORDER BY change_log.seq
+        LIMIT ?
+    ''', (seq, limit)).fetchall()
+    changes = [
+        [row_uid, op, version, changed_at, origin, None if op == 'delete' else list(values)]
+        for _, row_uid, op, version, changed_at, origin, *values in rows
+        if origin != exclude_origin
+    ]
+    if changes and not shared(conn):
+        with conn:  # Their uids are out now
+            conn.execute("INSERT OR REPLACE INTO sync_meta VALUES ('shared', 1)")
+    return {
+        'site_id': site_id(conn),
+        'columns': columns,
+        'changes': changes,
+        'last_seq': rows[-1][0] if rows else seq,
+        'more': len(rows) == limit,
+    }
+
+
+def validate_payload(table, payload):
+    """Raise ValueError unless `payload` holds changes to `table` shaped as changes_since() makes them.
+
+    Payloads come from peers, and their column names end up in SQL, so the columns
+    must be exactly the table's SYNC_COLUMNS.
+    """
+    columns = SYNC_COLUMNS[table]
+    if not isinstance(payload, dict) or not isinstance(payload.get('columns'), (list, tuple)) \
+            or list(payload['columns']) != list(columns):
+        raise ValueError(f"The columns must be {', '.join(columns)}")
+    changes = payload.get('changes')
+    if not isinstance(changes, list):
+        raise ValueError("The changes must be a list")
+    for index, change in enumerate(changes):
+        if not isinstance(change, list) or len(change) != 6:
+            raise ValueError(f"Change {index} is not a list of 6 items")
+        row_uid, op, version, changed_at, origin, values = change
+        if not all(isinstance(value, str) for value in (row_uid, changed_at, origin)) \
+                or op not in OPS or type(version) is not int:
+            raise ValueError(f"Change {index} is malformed")
+        if op == 'delete' and values is not None:
+            raise ValueError(f"Change {index} is a deletion with values")
+        if op != 'delete' and not (isinstance(values, list) and len(values) == len(columns)
+                                   and all(isinstance(value, VALUE_TYPES) for value in values)):
+            raise ValueError(f"Change {index} needs one plain value per column")
+
+
+def apply_changes(conn, table, payload):
+    """Apply a peer's changes that win over ours, in one transaction; returns how many did.
+
+    Each applied change is logged with its own version, timestamp and origin, so it
+    reaches third copies unchanged and is not sent back to where it came from.
+    Until this copy has shared any changes, a row it does not know yet is first
+    matched to one of its own rows holding the same values, which takes over the
+    row's uid and logged change instead of being duplicated.
+    Raises ValueError for a malformed payload, before changing anything.
+    """
+    validate_payload(table, payload)
+    columns = SYNC_COLUMNS[table]
+    unmatched = {} if shared(conn) else own_rows(conn, table)
+    assignments = ', '.join(f'{column} = ?' for column in columns)
+    extra = INSERT_VALUES[table]
+    insert = f'''
+        INSERT INTO {table} (uid, {', '.join([*columns, *extra])})
+        VALUES (?, {', '.join(['?'] * len(columns) + list(extra.values()))})
+    '''
+    applied = 0
+    with conn:
+        conn.execute("UPDATE sync_meta SET value = 1 WHERE key = 'applying'")  # Silences the log triggers
+        for row_uid, op, version, changed_at, origin, values in payload['changes']:
+            local = conn.execute('SELECT version, changed_at, origin FROM change_log WHERE row_uid = ?',
+                                 (row_uid,)).fetchone()
+            if local is not None and tuple(local) >= (version, changed_at, origin):
+                continue
+            if local is None and op != 'delete' and unmatched.get(tuple(values)):
+                own_uid = unmatched[tuple(values)].pop(0)
+                conn.execute(f'UPDATE {table} SET uid = ? WHERE uid = ?', (row_uid, own_uid))
+                conn.execute('''
+                    UPDATE change_log SET row_uid = ?, version = ?, changed_at = ?, origin = ?
+                    WHERE row_uid = ?
+                ''', (row_uid, version, changed_at, origin, own_uid))
+                continue
+            if op == 'delete':
+                conn.execute(f'DELETE FROM {table} WHERE uid = ?', (row_uid,))
+            elif not conn.execute(f'UPDATE {table} SET {assignments} WHERE uid = ?', (*values, row_uid)).rowcount:
+                conn.execute(insert, (row_uid, *values))
+            conn.execute('''
+                INSERT OR REPLACE INTO change_log (row_uid, seq, op, version, changed_at, origin)
+                VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), ?, ?, ?, ?)
+            ''', (row_uid, op, version, changed_at, origin))
+            applied += 1
+        conn.execute("UPDATE sync_meta SET value = 0 WHERE key = 'applying'")
+    return applied
+
+
+def own_rows(conn, table):
+    """Values -> uids of the rows with uids of this copy's making, oldest first."""
+    local_site = site_id(conn)
+    rows = {}
+    for row_uid, *values in conn.execute(f'''
+        SELECT uid, {', '.join(SYNC_COLUMNS[table])} FROM {table}
+        WHERE uid > ? AND uid < ?
+        ORDER BY uid
+    ''', (local_site + '-', local_site + '.')):  # '.' follows '-'
+        rows.setdefault(tuple(values), []).append(row_uid)
+    return rows
+
+
+def watermarks(conn, peer_site_id):
+    """(pulled, pushed): the last of the peer's sequence numbers we applied, and of ours it has."""
+    row = conn.execute('SELECT pulled, pushed FROM sync_peers WHERE site_id = ?', (peer_site_id,)).fetchone()
+    return tuple(row) if row else (0, 0)
+
+
+def save_watermark(conn, peer_site_id, name, seq):
+    with conn:
+        conn.execute(f'''
+            INSERT INTO sync_peers (site_id, {name}) VALUES (?, ?)
+            ON CONFLICT (site_id) DO UPDATE SET {name} = excluded.{name}
+        ''', (peer_site_id, seq))
+
+
+def payload_size(payload):
+    return len(json.dumps(payload, separators=(',', ':')))
+
+
+def sync(conn, table, peer):
+    """Pull the peer's new changes to `table`, then push ours; returns a SyncResult.
+
+    If only this copy has shared its changes, it pushes first instead, so that the
+    peer can match its rows to ours before receiving any of its own back.
+    """
+    local_site = site_id(conn)
+    peer_site = peer.site()
+    if peer_site['site_id'] == local_site:
+        raise ValueError("Cannot sync a database with itself or a copy of its file; "
+                         "run `python -m yournal new-site` on the copy first")
+    pulled_seq, pushed_seq = watermarks(conn, peer_site['site_id'])
+    counts = {'pulled': 0, 'pushed': 0, 'bytes': 0}
+
+    def pull():
+        nonlocal pulled_seq
+        while True:
+            payload = peer.changes_since(pulled_seq, local_site)
+            counts['bytes'] += payload_size(payload)
+            with conn:  # The batch and the watermark that covers it commit together
+                counts['pulled'] += apply_changes(conn, table, payload)
+                save_watermark(conn, peer_site['site_id'], 'pulled', payload['last_seq'])
+            pulled_seq = payload['last_seq']
+            if not payload['more']:
+                break
+
+    def push():
+        nonlocal pushed_seq
+        while True:
+            payload = changes_since(conn, table, pushed_seq, peer_site['site_id'])
+            if payload['changes']:
+                counts['bytes'] += payload_size(payload)
+                counts['pushed'] += peer.apply(payload)
+            save_watermark(conn, peer_site['site_id'], 'pushed', payload['last_seq'])
+            pushed_seq = payload['last_seq']
+            if not payload['more']:
+                break
+
+    for step in ((push, pull) if shared(conn) and not peer_site['shared'] else (pull, push)):
+        step()
+    return SyncResult(counts['pulled'], counts['pushed'], counts['bytes'])
+
+
+class FilePeer:
+    """Another copy of a synced database, opened directly (e.g. on a shared or mounted drive)."""
+
+    def __init__(self, path, table):
+        self.table = table
+        self.conn = storage.open_connection(path, TABLES[table][1])
+
+    def site(self):
+        return site(self.conn)
+
+    def changes_since(self, seq, exclude_origin):
+        return changes_since(self.conn, self.table, seq, exclude_origin)
+
+    def apply(self, payload):
+        return apply_changes(self.conn, self.table, payload)
+
+    def close(self):
+        self.conn.close()
+
+
+class HttpPeer:
+    """A copy served by serve(); the payloads travel as JSON, with the token (default: $YOURNAL_SYNC_TOKEN)."""
+    TIMEOUT = 30
+
+    def __init__(self, url, table, token=None):
+        self.url = f"{url.rstrip('/')}/{table}"
+        self.headers = {'Content-Type': 'application/json'}
+        token = token or os.environ.get(TOKEN_ENV)
+        if token:
+            self.headers['Authorization'] = f'Bearer {token}'
+
+    def request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload, separators=(',', ':')).encode()
+        request = urllib.request.Request(self.url + path, data, self.headers)
+        with urllib.request.urlopen(request, timeout=HttpPeer.TIMEOUT) as response:
+            return json.load(response)
+
+    def site(self):
+        return self.request('/site')
+
+    def changes_since(self, seq, exclude_origin):
+        return self.request('/changes?' + urllib.parse.urlencode({'since': seq, 'exclude': exclude_origin}))
+
+    def apply(self, payload):
+        return self.request('/changes', payload)['applied']
+
+    def close(self):
+        pass
+
+
+def open_peer(location, table, token=None):
+    """An HttpPeer for an http(s) URL, otherwise a FilePeer for the table's file in that folder."""
+    if location.startswith(('http://', 'https://')):
+        return HttpPeer(location, table, token)
+    return FilePeer(os.path.join(location, TABLES[table][0]), table)
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """GET /<table>/site, GET /<table>/changes?since=N&exclude=SITE and POST /<table>/changes.
+
+    Answers 401 without the server's token, 400 for a malformed request and 500 if
+    the database fails.
+    """
+
+    def connection_for(self, table):
+        return storage.connect(self.server.database_paths[table], TABLES[table][1])
+
+    def route(self):
+        url = urllib.parse.urlsplit(self.path)
+        table, _, action = url.path.strip('/').partition('/')
+        if table not in TABLES:
+            return None, None, None
+        return table, action, urllib.parse.parse_qs(url.query)
+
+    def do_GET(self):
+        self.respond(self.get)
+
+    def do_POST(self):
+        self.respond(self.post)
+
+    def get(self):
+        table, action, query = self.route()
+        if action == 'site':
+            return site(self.connection_for(table))
+        if action == 'changes':
+            return changes_since(self.connection_for(table), table, int(query.get('since', ['0'])[0]),
+                                 query.get('exclude', [None])[0])
+        return None
+
+    def post(self):
+        table, action, query = self.route()
+        if action != 'changes':
+            return None
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        return {'applied': apply_changes(self.connection_for(table), table, payload)}
+
+    def authorized(self):
+        if self.server.token is None:
+            return True
+        expected = f'Bearer {self.server.token}'.encode()
+        return hmac.compare_digest(self.headers.get('Authorization', '').encode(), expected)
+
+    def respond(self, handler):
+        """Reply with what `handler` returns, or the matching error."""
+        if not self.authorized():
+            self.send_error(401)
+            return
+        try:
+            body = handler()
+        except (ValueError, TypeError) as e:  # Including bad JSON, a bad 'since' or a missing Content-Length
+            self.send_error(400, str(e))
+            return
+        except Exception as e:
+            print(f"Sync request {self.command} {self.path} failed: {e}", file=sys.stderr)
+            self.send_error(500)
+            return
+        if body is None:
+            self.send_error(404)
+        else:
+            self.reply(body)
+
+    def reply(self, body):
+        data = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:  # A host name, or '' for every address
+        return False
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, token=None):
+    """An HTTP server sharing the working directory's (or logged-in user's) databases with peers.
+
+    Peers must send `token` (default: $YOURNAL_SYNC_TOKEN). Without one the server
+    only listens on a loopback address; raises ValueError otherwise. The token
+    travels in plain text, so other hosts should reach it over a trusted network
+    or a TLS proxy. The database paths are resolved once, here.
+    """
+    token = token or os.environ.get(TOKEN_ENV) or None
+    if token is None and not loopback(host):
+        raise ValueError(f"Listening on {host or 'every address'} needs a token (--token or ${TOKEN_ENV})")
+    server = ThreadingHTTPServer((host, port), SyncRequestHandler)
+    server.token = token
+    server.database_paths = {
+        table: os.path.abspath(router.database_path(file_name)) for table, (file_name, _) in TABLES.items()
+    }
+    return server
@@ -0,0 +1,366 @@
+"""Tasks and recurring goals stored in tasks.db, used by Self_Goals.py and the command line.
+
+Each logged-in user has their own tasks.db; see yournal.router.
+"""
+import heapq
+import itertools
+from datetime import date, datetime, timedelta
+from sys import intern
+
+from . import router, storage
+from .instrumentation import instrumented
+from .migrations import TASK_MIGRATIONS
+
+
+RECURRENCES = ('daily', 'weekly')
+
+
+def period_of(recurrence, day):
+    """The check-in period containing `day`: the day itself, or the Monday of its week."""
+    if recurrence == 'weekly':
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def previous_period(recurrence, period):
+    step = timedelta(weeks=1) if recurrence == 'weekly' else timedelta(days=1)
+    return (date.fromisoformat(period) - step).isoformat()
+
+
+class Task:
+    __slots__ = ('id', 'description', 'completed', 'priority', 'due_date',
+                 'recurrence', 'current_streak', 'longest_streak', 'last_period')  # No per-task __dict__
+
+    def __init__(self, id, description, completed=False, priority=0, due_date=None,
+                 recurrence=None, current_streak=0, longest_streak=0, last_period=None):
+        self.id = id
+        self.description = description
+        self.completed = completed
+        self.priority = priority  # Higher comes first
+        self.due_date = due_date  # ISO date string (YYYY-MM-DD) or None
+        self.recurrence = recurrence  # None for a one-off task, else one of RECURRENCES
+        self.current_streak = current_streak  # Consecutive periods checked in, up to last_period
+        self.longest_streak = longest_streak
+        self.last_period = last_period
+
+    def mark_completed(self):
+        self.completed = True
+
+    def check_in(self, period):
+        """Extend the streaks with a check-in for a period after the last one."""
+        if self.last_period is not None and self.last_period == previous_period(self.recurrence, period):
+            self.current_streak += 1
+        else:
+            self.current_streak = 1
+        self.longest_streak = max(self.longest_streak, self.current_streak)
+        self.last_period = period
+
+    def streak(self, today):
+        """The current streak as of `today`: 0 once a whole period has gone by without a check-in."""
+        if self.last_period is None:
+            return 0
+        period = period_of(self.recurrence, today)
+        return self.current_streak if self.last_period in (period, previous_period(self.recurrence, period)) else 0
+
+    def __str__(self):
+        status = "[X]" if self.completed else "[ ]"
+        return f"{status} {self.description}"
+
+
+class TaskQueue:
+    """Heap of open tasks ordered by `key`, for "what next" queries without sorting the list.
+
+    Changed tasks are pushed again rather than searched for; entries that no longer
+    match their task (completed, removed or re-keyed) are dropped when they surface.
+    """
+    COMPACT_SLACK = 1024  # Stale entries tolerated before the heap is rebuilt
+
+    def __init__(self, key, tasks=()):
+        self.key = key  # Task -> sort key, or None to leave the task out
+        self.counter = itertools.count()  # Tie-breaker, so Task objects are never compared
+        self.removed = set()  # Ids of removed tasks that may still have entries
+        self.compact(tasks)
+
+    def compact(self, tasks):
+        self.heap = [(key, task.id, next(self.counter), task)
+                     for task in tasks if (key := self.entry_key(task)) is not None]
+        heapq.heapify(self.heap)
+        self.removed.clear()
+        self.compacted_size = len(self.heap)
+
+    def entry_key(self, task):
+        return None if task.completed else self.key(task)
+
+    def push(self, task):
+        """Queue a new or changed task."""
+        key = self.entry_key(task)
+        if key is not None:
+            heapq.heappush(self.heap, (key, task.id, next(self.counter), task))
+        if len(self.heap) > 2 * self.compacted_size + TaskQueue.COMPACT_SLACK:
+            self.compact({entry[-1] for entry in self.heap if self.is_current(entry)})
+
+    def discard(self, task):
+        self.removed.add(task.id)
+
+    def is_current(self, entry):
+        key, task_id, _, task = entry
+        return task_id not in self.removed and self.entry_key(task) == key
+
+    def first(self, n=None, below=None):
+        """The first n queued tasks (with a key under `below` if given), in key order."""
+        found, seen = [], set()
+        while self.heap and (n is None or len(found) < n):
+            entry = self.heap[0]
+            if below is not None and entry[0] >= below:
+                break
+            heapq.heappop(self.heap)
+            if entry[1] not in seen and self.is_current(entry):
+                seen.add(entry[1])
+                found.append(entry)
+        for entry in found:  # Only the stale entries stay popped
+            heapq.heappush(self.heap, entry)
+        return [entry[-1] for entry in found]
+
+
+@instrumented
+class TaskList:
+    DB_FILE = 'tasks.db'
+    NO_DUE_DATE = '9999-12-31'  # Sorts undated tasks after dated ones of the same priority
+
+    def __init__(self, username=None):
+        self.path = router.database_path(TaskList.DB_FILE, username)  # The current user's, by default
+        self.conn = storage.connect(self.path, TASK_MIGRATIONS)
+        self.cursor = self.conn.cursor()
+        self.by_priority = self.by_due_date = None  # TaskQueues, built on the first query
+        self.load_tasks()
+
+    def load_tasks(self):
+        # Stream the rows instead of fetchall(), and share one string per repeated description
+        self.tasks = [
+            Task(task_id, intern(description), bool(completed), *fields)
+            for task_id, description, completed, *fields in self.cursor.execute('''
+                SELECT id, description, completed, priority, due_date,
+                       recurrence, current_streak, longest_streak, last_period
+                FROM tasks
+            ''')
+        ]
+        self.by_priority = self.by_due_date = None
+
+    def queues(self):
+        if self.by_priority is None:
+            self.by_priority = TaskQueue(
+                lambda task: (-task.priority, task.due_date or TaskList.NO_DUE_DATE), self.tasks
+            )
+            self.by_due_date = TaskQueue(lambda task: task.due_date, self.tasks)
+        return self.by_priority, self.by_due_date
+
+    def requeue(self, tasks):
+        """Bring the queues up to date after the tasks' priority or due date changed."""
+        if self.by_priority is not None:
+            for task in tasks:
+                self.by_priority.push(task)
+                self.by_due_date.push(task)
+
+    def add_task(self, description, priority=0, due_date=None, recurrence=None):
+        due_date = self.check_due_date(due_date)
+        if recurrence is not None and recurrence not in RECURRENCES:
+            raise ValueError(f"Unknown recurrence: {recurrence}")
+        with self.conn:
+            self.cursor.execute(
+                "INSERT INTO tasks (description, completed, priority, due_date, recurrence) VALUES (?, ?, ?, ?, ?)",
+                (description, 0, priority, due_date, recurrence)
+            )
+        task = Task(self.cursor.lastrowid, description, False, priority, due_date, recurrence)
+        self.tasks.append(task)
+        self.requeue([task])
+        return task.id  # Return the ID of the newly added task
+
+    def schedule_task(self, index, priority, due_date=None):
+        """Set the priority and due date of the task at `index`."""
+        due_date = self.check_due_date(due_date)
+        if 0 <= index < len(self.tasks):
+            task = self.tasks[index]
+            with self.conn:
+                self.cursor.execute(
+                    "UPDATE tasks SET priority = ?, due_date = ? WHERE id = ?", (priority, due_date, task.id)
+                )
+            task.priority, task.due_date = priority, due_date
+            self.requeue([task])
+
+    def check_due_date(self, due_date):
+        """Normalise a due date to YYYY-MM-DD; raises ValueError if it is not a date."""
+        return date.fromisoformat(due_date).isoformat() if due_date else None
+
+    def next_tasks(self, n=10):
+        """The n open tasks to do next: highest priority first, then earliest due date."""
+        return self.rows(self.queues()[0].first(n))
+
+    def overdue_tasks(self, today=None):
+        """Open tasks due before today, earliest first."""
+        today = today or date.today().isoformat()
+        return self.rows(self.queues()[1].first(below=today))
+
+    def indices_of(self, task_ids):
+        """List positions of the tasks with the given ids, for the index-based methods."""
+        wanted = set(task_ids)
+        return [index for index, task in enumerate(self.tasks) if task.id in wanted]
+
+    def selected_tasks(self, indices):
+        return [self.tasks[index] for index in set(indices) if 0 <= index < len(self.tasks)]
+
+    def complete_tasks(self, indices, day=None):
+        """Complete one-off tasks and check recurring ones in for `day` (default today).
+
+        Returns {index: row} with the updated row of each task.
+        """
+        tasks = self.selected_tasks(indices)
+        day = day or date.today()
+        one_off = [task for task in tasks if task.recurrence is None]
+        with self.conn:  # One statement and one commit for the whole selection
+            self.cursor.executemany("UPDATE tasks SET completed = 1 WHERE id = ?", [(task.id,) for task in one_off])
+            for task in tasks:
+                if task.recurrence is not None:
+                    self.check_in(task, day)
+        for task in one_off:
+            task.mark_completed()
+        return {index: self.rows([self.tasks[index]])[0]
+                for index in set(indices) if 0 <= index < len(self.tasks)}
+
+    def check_in(self, task, day):
+        """Record a check-in and update the task's streaks from its previous state alone."""
+        period = period_of(task.recurrence, day)
+        if task.last_period is not None and period <= task.last_period:
+            if period == task.last_period:
+                return  # Already checked in for this period
+            # A check-in for an earlier period can join or split runs: recount from the history
+            self.cursor.execute(
+                "INSERT OR IGNORE INTO task_completions (task_id, period, completed_at) VALUES (?, ?, ?)",
+                (task.id, period, datetime.now().isoformat(timespec='seconds'))
+            )
+            task.current_streak = task.longest_streak = 0
+            task.last_period = None
+            for (history_period,) in self.conn.execute(
+                "SELECT period FROM task_completions WHERE task_id = ? ORDER BY period", (task.id,)
+            ):
+                task.check_in(history_period)
+        else:
+            self.cursor.execute(
+                "INSERT INTO task_completions (task_id, period, completed_at) VALUES (?, ?, ?)",
+                (task.id, period, datetime.now().isoformat(timespec='seconds'))
+            )
+            task.check_in(period)
+        self.cursor.execute(
+            "UPDATE tasks SET current_streak = ?, longest_streak = ?, last_period = ? WHERE id = ?",
+            (task.current_streak, task.longest_streak, task.last_period, task.id)
+        )
+
+    def history(self, index, limit=30, before=None):
+        """The task's row and its latest check-ins as (period, completed_at), newest first.
+
+        Pass the oldest period seen as `before` for the next page; each page is a seek
+        on the (task_id, period) key, however long the history.
+        """
+        if not 0 <= index < len(self.tasks):
+            return None, []
+        task = self.tasks[index]
+        checkins = self.conn.execute('''
+            SELECT period, completed_at FROM task_completions
+            WHERE task_id = ? AND period < ?
+            ORDER BY period DESC
+            LIMIT ?
+        ''', (task.id, before or TaskList.NO_DUE_DATE, limit)).fetchall()
+        return self.rows([task])[0], checkins
+
+    def remove_completed_tasks(self, indices):
+        tasks = self.selected_tasks(indices)
+        with self.conn:
+            self.cursor.executemany("DELETE FROM tasks WHERE id = ?", [(task.id,) for task in tasks])
+            self.cursor.executemany("DELETE FROM task_completions WHERE task_id = ?", [(task.id,) for task in tasks])
+        removed = set(map(id, tasks))
+        self.tasks = [task for task in self.tasks if id(task) not in removed]
+        if self.by_priority is not None:
+            for task in tasks:
+                self.by_priority.discard(task)
+                self.by_due_date.discard(task)
+
+    def edit_task(self, index, new_description):
+        if 0 <= index < len(self.tasks):
+            task_id = self.tasks[index].id
+            with self.conn:
+                self.cursor.execute("UPDATE tasks SET description = ? WHERE id = ?", (new_description, task_id))
+            self.tasks[index].description = new_description
+
+    # By-id forms of the index-based methods, for callers whose positions may be stale by
+    # the time the call runs, such as Self_Goals queueing writes on its DatabaseWorker
+
+    def index_of(self, task_id):
+        """List position of the task with `task_id`, or -1 if it is gone."""
+        indices = self.indices_of([task_id])
+        return indices[0] if indices else -1
+
+    def complete_task_ids(self, task_ids, day=None):
+        """complete_tasks() by id; returns {task id: row} for the tasks that still exist."""
+        return {row[0]: row for row in self.complete_tasks(self.indices_of(task_ids), day).values()}
+
+    def remove_task_ids(self, task_ids):
+        self.remove_completed_tasks(self.indices_of(task_ids))
+
+    def edit_task_id(self, task_id, new_description):
+        self.edit_task(self.index_of(task_id), new_description)
+
+    def schedule_task_id(self, task_id, priority, due_date=None):
+        self.schedule_task(self.index_of(task_id), priority, due_date)
+
+    def task_history(self, task_id, limit=30, before=None):
+        return self.history(self.index_of(task_id), limit, before)
+
+    def import_tasks(self, path, fmt=None, progress=None):
+        """Bulk-add the tasks of a JSONL/CSV file or Markdown folder; see yournal.transfer."""
+        from . import transfer
+        return transfer.import_tasks(self, path, fmt, progress)
+
+    def export_tasks(self, path, fmt=None, progress=None):
+        """Write every task to a JSONL/CSV file or Markdown folder; see yournal.transfer."""
+        from . import transfer
+        return transfer.export_tasks(self, path, fmt, progress)
+
+    def sync(self, location, token=None):
+        """Exchange changes with another copy: a folder or a sync server URL; see yournal.sync."""
+        from . import sync
+        peer = sync.open_peer(location, 'tasks', token)
+        try:
+            result = sync.sync(self.conn, 'tasks', peer)
+        finally:
+            peer.close()
+        if result.pulled:
+            self.load_tasks()
+        return result
+
+    def new_sync_site(self):
+        """Give this copy, made from an already synced file, its own site id; see yournal.sync.new_site."""
+        from . import sync
+        return sync.new_site(self.conn, 'tasks')
+
+    def show_tasks(self):
+        return [str(task) for task in self.tasks]
+
+    def task_rows(self):
+        """The tasks as tuples in TaskListModel field order."""
+        return self.rows(self.tasks)
+
+    def rows(self, tasks):
+        """(id, description, done, priority, due_date, recurrence, current_streak, longest_streak) per task.
+
+        A recurring task counts as done once checked in for the current period.
+        """
+        today = date.today()
+        return [
+            (task.id, task.description,
+             task.completed or (task.recurrence is not None and task.last_period == period_of(task.recurrence, today)),
+             task.priority, task.due_date, task.recurrence, task.streak(today) if task.recurrence else 0,
+             task.longest_streak)
+            for task in tasks
+        ]
+
+    def close(self):
+        storage.close(self.path)
@@ -0,0 +1,275 @@
+"""Streaming import and export of journal entries and tasks.
+
+Formats: 'jsonl' (one JSON object per line), 'csv' (with a header row) and 'markdown'
+(a folder: one .md file per entry, or a tasks.md checklist). Records flow through
+generators, rows are inserted with executemany in chunks of CHUNK_SIZE, each chunk in
+its own transaction, and entry numbers are assigned up front from MAX(number) once.
+Memory use therefore does not grow with the file size. Chunks committed before an
+error stay imported.
+
+`progress`, if given, is called with the number of records done after every chunk.
+"""
+import csv
+import datetime
+import functools
+import itertools
+import json
+import os
+import re
+import sys
+
+from .tasks import RECURRENCES
+
+FORMATS = ('jsonl', 'csv', 'markdown')
+CHUNK_SIZE = 2000
+ENTRY_FIELDS = ('number', 'title', 'content', 'mood', 'date', 'created_at')
+TASK_FIELDS = ('id', 'description', 'completed', 'priority', 'due_date', 'recurrence')
+ENTRY_DATE_FORMAT = "%d-%m-%Y"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TASKS_MARKDOWN = 'tasks.md'
+TASK_LINE = re.compile(r'^- \[(?P<done>[ xX])\] (?P<description>.*?)(?: <!-- (?P<fields>.*) -->)?$')
+
+
+def detect_format(path):
+    """Guess the format from the path: a folder is markdown, .csv is csv, anything else jsonl."""
+    if path == '-':
+        return 'jsonl'
+    if os.path.isdir(path) or not os.path.splitext(path)[1]:
+        return 'markdown'
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def open_text(path, mode, **kwargs):
+    """Open a text file, or stdin/stdout for '-'."""
+    if path == '-':
+        return open((sys.stdout if 'w' in mode else sys.stdin).fileno(), mode, encoding='utf-8', closefd=False,
+                    **kwargs)
+    return open(path, mode, encoding='utf-8', **kwargs)
+
+
+def chunked(iterable, size=CHUNK_SIZE):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def insert_chunks(conn, sql, rows, progress=None):
+    """executemany `rows` one chunk per transaction; returns the number of rows."""
+    count = 0
+    for chunk in chunked(rows):
+        with conn:
+            conn.executemany(sql, chunk)
+        count += len(chunk)
+        if progress is not None:
+            progress(count)
+    return count
+
+
+def report_every(records, progress):
+    """Pass records through, calling `progress` every CHUNK_SIZE records and at the end."""
+    count = 0
+    for count, record in enumerate(records, 1):
+        yield record
+        if progress is not None and count % CHUNK_SIZE == 0:
+            progress(count)
+    if progress is not None and count % CHUNK_SIZE:
+        progress(count)
+
+
+# Readers, yielding one dict per record
+
+def read_jsonl(path):
+    with open_text(path, 'r') as lines:
+        for line_number, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{path}:{line_number}: {e}") from e
+
+
+def read_csv(path):
+    with open_text(path, 'r', newline='') as rows:
+        yield from csv.DictReader(rows)
+
+
+def read_entry_markdown(folder):
+    """Read the .md files of a folder, in file name order: front matter, a blank line, the content."""
+    for name in sorted(name for name in os.listdir(folder) if name.endswith('.md')):
+        with open(os.path.join(folder, name), encoding='utf-8') as file:
+            text = file.read()
+        record = {}
+        if text.startswith('---\n'):
+            header, _, text = text[4:].partition('\n---\n')
+            for line in header.splitlines():
+                key, _, value = line.partition(':')
+                record[key.strip()] = value.strip()
+            text = text[1:] if text.startswith('\n') else text
+        record['content'] = text[:-1] if text.endswith('\n') else text
+        record.setdefault('title', os.path.splitext(name)[0])
+        yield record
+
+
+def read_task_markdown(folder):
+    """Read the '- [ ] description <!-- key=value ... -->' lines of the folder's tasks.md."""
+    with open(os.path.join(folder, TASKS_MARKDOWN), encoding='utf-8') as lines:
+        for line in lines:
+            match = TASK_LINE.match(line.rstrip('\n'))
+            if match:
+                record = dict(field.split('=', 1) for field in (match['fields'] or '').split() if '=' in field)
+                record.update(description=match['description'], completed=match['done'] != ' ')
+                yield record
+
+
+# Writers, consuming dicts
+
+def write_jsonl(records, path):
+    with open_text(path, 'w') as output:
+        for record in records:
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def write_csv(records, path, fields):
+    with open_text(path, 'w', newline='') as output:
+        writer = csv.DictWriter(output, fields)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def write_entry_markdown(records, folder):
+    os.makedirs(folder, exist_ok=True)
+    for record in records:
+        slug = re.sub(r'[^a-z0-9]+', '-', (record['title'] or '').lower()).strip('-')[:40]
+        header = ''.join(f"{key}: {' '.join(str(record[key]).split())}\n"
+                         for key in ENTRY_FIELDS if key != 'content' and record[key] is not None)
+        with open(os.path.join(folder, f"{record['number']:06d}-{slug or 'entry'}.md"), 'w', encoding='utf-8') as file:
+            file.write(f"---\n{header}---\n\n{record['content'] or ''}\n")
+
+
+def write_task_markdown(records, folder):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, TASKS_MARKDOWN), 'w', encoding='utf-8') as output:
+        for record in records:
+            fields = ' '.join(f"{key}={record[key]}" for key in ('priority', 'due_date', 'recurrence')
+                              if record[key] not in (None, 0))
+            description = ' '.join(record['description'].split())
+            output.write(f"- [{'x' if record['completed'] else ' '}] {description}"
+                         + (f" <!-- {fields} -->" if fields else "") + "\n")
+
+
+def read_records(path, fmt, markdown_reader):
+    if fmt == 'jsonl':
+        return read_jsonl(path)
+    if fmt == 'csv':
+        return read_csv(path)
+    if fmt == 'markdown':
+        return markdown_reader(path)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def write_records(records, path, fmt, fields, markdown_writer):
+    if fmt == 'jsonl':
+        write_jsonl(records, path)
+    elif fmt == 'csv':
+        write_csv(records, path, fields)
+    elif fmt == 'markdown':
+        markdown_writer(records, path)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+# Entries
+
+@functools.lru_cache(maxsize=4096)
+def date_to_timestamp(entry_date):
+    """created_at for an entry that only has a date; cached, as exports repeat dates a lot."""
+    return datetime.datetime.strptime(entry_date, ENTRY_DATE_FORMAT).strftime(TIMESTAMP_FORMAT)
+
+
+def timestamp_date(created_at):
+    """The entry date (DD-MM-YYYY) of a created_at timestamp."""
+    return f"{created_at[8:10]}-{created_at[5:7]}-{created_at[:4]}"
+
+
+def entry_timestamps(record):
+    """(date, created_at) of an imported entry, each derived from the other if missing."""
+    created_at, entry_date = record.get('created_at'), record.get('date')
+    if created_at:
+        created_at = datetime.datetime.fromisoformat(created_at).strftime(TIMESTAMP_FORMAT)
+        return entry_date or timestamp_date(created_at), created_at
+    if entry_date:
+        return entry_date, date_to_timestamp(entry_date)
+    created_at = datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+    return timestamp_date(created_at), created_at
+
+
+def import_entries(journal, path, fmt=None, progress=None):
+    """Add the entries of a file or folder after the existing ones; returns how many were added."""
+    fmt = fmt or detect_format(path)
+    first_number = (journal.conn.execute('SELECT MAX(number) FROM journal_entries').fetchone()[0] or 0) + 1
+
+    def rows():
+        for number, record in enumerate(read_records(path, fmt, read_entry_markdown), first_number):
+            entry_date, created_at = entry_timestamps(record)
+            yield (number, record.get('title') or '', record.get('content') or '', record.get('mood') or None,
+                   entry_date, created_at)
+
+    return insert_chunks(journal.conn, '''
+        INSERT INTO journal_entries (number, title, content, mood, date, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows(), progress)
+
+
+def export_entries(journal, path, fmt=None, progress=None):
+    """Write every entry, in number order; returns how many were written."""
+    fmt = fmt or detect_format(path)
+    count = 0
+
+    def records():
+        nonlocal count
+        for count, entry in enumerate(journal.iter_entries(columns=ENTRY_FIELDS), 1):
+            yield dict(zip(ENTRY_FIELDS, entry))
+
+    write_records(report_every(records(), progress), path, fmt, ENTRY_FIELDS, write_entry_markdown)
+    return count
+
+
+# Tasks
+
+def import_tasks(task_list, path, fmt=None, progress=None):
+    """Add the tasks of a file or folder, then reload the task list; returns how many were added."""
+    fmt = fmt or detect_format(path)
+
+    def rows():
+        for record in read_records(path, fmt, read_task_markdown):
+            recurrence = record.get('recurrence') or None
+            if recurrence is not None and recurrence not in RECURRENCES:
+                raise ValueError(f"Unknown recurrence: {recurrence}")
+            completed = record.get('completed')
+            if isinstance(completed, str):
+                completed = completed.strip().lower() in ('1', 'true', 'yes', 'x')
+            yield (record.get('description') or '', int(bool(completed)), int(record.get('priority') or 0),
+                   task_list.check_due_date(record.get('due_date')), recurrence)
+
+    count = insert_chunks(task_list.conn, '''
+        INSERT INTO tasks (description, completed, priority, due_date, recurrence) VALUES (?, ?, ?, ?, ?)
+    ''', rows(), progress)
+    task_list.load_tasks()
+    return count
+
+
+def export_tasks(task_list, path, fmt=None, progress=None):
+    """Write every task, in id order, straight from the database; returns how many were written."""
+    fmt = fmt or detect_format(path)
+    count = 0
+
+    def records():
+        nonlocal count
+        cursor = task_list.conn.execute(f"SELECT {', '.join(TASK_FIELDS)} FROM tasks ORDER BY id")
+        for count, row in enumerate(cursor, 1):
+            record = dict(zip(TASK_FIELDS, row))
+            record['completed'] = bool(record['completed'])
+            yield record
+
+    write_records(report_every(records(), progress), path, fmt, TASK_FIELDS, write_task_markdown)
+    return count
@@ -0,0 +1,73 @@
+"""Qt side of yournal.transfer: picking the file or folder and showing the progress."""
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QFileDialog, QInputDialog, QMessageBox, QProgressDialog
+
+from .transfer import FORMATS
+
+FILE_FILTERS = {'jsonl': "JSON lines (*.jsonl *.json)", 'csv': "CSV (*.csv)"}
+
+
+def choose_path(parent, title, saving):
+    """Ask for a format, then a file (or a folder for markdown); returns (path, format) or None."""
+    fmt, ok = QInputDialog.getItem(parent, title, "Format:", FORMATS, 0, False)
+    if not ok:
+        return None
+    if fmt == 'markdown':
+        path = QFileDialog.getExistingDirectory(parent, title)
+    elif saving:
+        path, _ = QFileDialog.getSaveFileName(parent, title, f"export.{fmt}", FILE_FILTERS[fmt])
+    else:
+        path, _ = QFileDialog.getOpenFileName(parent, title, "", FILE_FILTERS[fmt])
+    return (path, fmt) if path else None
+
+
+class TransferProgress(QProgressDialog):
+    """Runs an import or export on a DatabaseWorker and shows the running count until it ends.
+
+    `method` is the store's import_* or export_* method; `finished` is called afterwards,
+    also after a failure, as the chunks committed before it stay imported.
+    """
+
+    def __init__(self, worker, method, noun, parent=None, finished=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.noun = noun
+        self.finished_callback = finished
+        self.importing = method.startswith('import')
+        self.title = f"{'Import' if self.importing else 'Export'} {noun}"
+        self.request_id = None
+
+        self.setWindowTitle(self.title)
+        self.setLabelText(f"{self.title}...")
+        self.setRange(0, 0)  # The total is unknown while streaming, so just show activity
+        self.setCancelButton(None)
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+
+        chosen = choose_path(parent, self.title, saving=not self.importing)
+        if chosen is None:
+            self.deleteLater()
+            return
+        worker.progress_made.connect(self.show_count)
+        worker.request_failed.connect(self.request_failed)
+        self.request_id = worker.bulk(method, *chosen, callback=self.done_transfer)
+        self.show()
+
+    def show_count(self, count):
+        self.setLabelText(f"{count} {self.noun} so far...")
+
+    def done_transfer(self, count):
+        self.finish(f"{count} {self.noun} {'imported' if self.importing else 'exported'}.")
+
+    def request_failed(self, request_id, message):
+        if request_id == self.request_id:
+            self.finish(f"{self.title} failed: {message}")
+
+    def finish(self, message):
+        self.worker.progress_made.disconnect(self.show_count)
+        self.worker.request_failed.disconnect(self.request_failed)
+        self.close()
+        self.deleteLater()
+        QMessageBox.information(self.parent(), self.title, message)
+        if self.finished_callback is not None:
+            self.finished_callback()
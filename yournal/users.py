@@ -0,0 +1,80 @@
+"""Registered users stored in users.db, shared by the login panel and the command line.
+
+Passwords are stored encrypted with a fixed Fernet key, as the login panel always
+has. cryptography is imported on first use, so listing users stays cheap.
+"""
+import sqlite3
+
+from . import storage
+from .migrations import USER_MIGRATIONS
+
+KEY = b'G1uOU6RQF_8jEBb-uDd9grbU8SPhXZcWxv1Whtw3PpA='  # Fixed key for encrypting and decrypting passwords
+DATABASE_NAME = 'users.db'
+
+_cipher = None
+
+
+def cipher():
+    """The Fernet object encrypting the passwords."""
+    global _cipher
+    if _cipher is None:
+        from cryptography.fernet import Fernet
+        _cipher = Fernet(KEY)
+    return _cipher
+
+
+def connect(database_name=DATABASE_NAME):
+    """Get the shared connection to the users database, migrated to the current schema."""
+    return storage.connect(database_name, USER_MIGRATIONS)
+
+
+def user_exists(username, database_name=DATABASE_NAME):
+    return user_id(username, database_name) is not None
+
+
+def user_id(username, database_name=DATABASE_NAME):
+    """The user's id, which never changes or gets reused, or None if there is no such user."""
+    row = connect(database_name).execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    return None if row is None else row[0]
+
+
+def register_user(username, password, database_name=DATABASE_NAME):
+    """Add a user; returns False if the username is already taken, in any letter case."""
+    conn = connect(database_name)
+    try:
+        with conn:
+            conn.execute("INSERT INTO users (username, username_key, password) VALUES (?, ?, ?)",
+                         (username, username.casefold(), cipher().encrypt(password.encode())))
+    except sqlite3.IntegrityError:  # UNIQUE username or username_key
+        return False
+    return True
+
+
+def check_password(username, password, database_name=DATABASE_NAME):
+    """Whether `password` is the user's password, or None if there is no such user."""
+    row = connect(database_name).execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+    if row is None:
+        return None
+    return cipher().decrypt(row[0]).decode() == password
+
+
+def change_password(username, password, database_name=DATABASE_NAME):
+    """Set a new password; returns False if there is no such user."""
+    conn = connect(database_name)
+    with conn:
+        cursor = conn.execute("UPDATE users SET password = ? WHERE username = ?",
+                              (cipher().encrypt(password.encode()), username))
+    return cursor.rowcount > 0
+
+
+def delete_user(username, database_name=DATABASE_NAME):
+    """Remove a user; returns False if there is no such user."""
+    conn = connect(database_name)
+    with conn:
+        cursor = conn.execute("DELETE FROM users WHERE username = ?", (username,))
+    return cursor.rowcount > 0
+
+
+def list_users(database_name=DATABASE_NAME):
+    """(username, encrypted password) of every user, in registration order."""
+    return connect(database_name).execute("SELECT username, password FROM users ORDER BY id").fetchall()
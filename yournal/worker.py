@@ -0,0 +1,132 @@
+"""Qt worker thread that keeps SQLite off the GUI thread."""
+import collections
+import itertools
+import queue
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from . import storage
+
+STOP = object()  # Queued by stop() to end the worker loop
+
+
+class DatabaseWorker(QThread):
+    """Runs storage calls on a thread-owned store and delivers their results through signals.
+
+    `store_factory` is called on the worker thread (e.g. Journal, or a partial binding its user),
+    so the store gets its own connection from yournal.storage. Requests run in the order
+    they were queued; writes queued back to back are committed as one transaction.
+    Every request ends in result_ready or request_failed: if the store cannot be
+    created, every request fails, and if a batch cannot commit, each of its writes does.
+    """
+    result_ready = pyqtSignal(int, object)
+    request_failed = pyqtSignal(int, str)
+    progress_made = pyqtSignal(int)  # Records done so far by the running bulk() request
+
+    def __init__(self, store_factory, parent=None):
+        super().__init__(parent)
+        self.store_factory = store_factory
+        self.requests = queue.Queue()
+        self.callbacks = {}  # Request id -> callback, only touched on the GUI thread
+        self.request_ids = itertools.count(1)
+        self.result_ready.connect(self.deliver_result)
+        self.request_failed.connect(self.report_failure)
+
+    def read(self, method, *args, callback=None, **kwargs):
+        """Queue a call to a store method that only reads."""
+        return self.submit(False, method, args, kwargs, callback)
+
+    def write(self, method, *args, callback=None, **kwargs):
+        """Queue a call to a store method that writes."""
+        return self.submit(True, method, args, kwargs, callback)
+
+    def bulk(self, method, *args, callback=None, **kwargs):
+        """Queue a long call that commits in chunks itself, such as an import or export.
+
+        It runs outside the batched write transaction and gets a `progress` keyword
+        argument that emits progress_made.
+        """
+        return self.submit(False, method, args, dict(kwargs, progress=self.progress_made.emit), callback)
+
+    def submit(self, is_write, method, args, kwargs, callback):
+        request_id = next(self.request_ids)
+        if callback is not None:
+            self.callbacks[request_id] = callback
+        self.requests.put((request_id, is_write, method, args, kwargs))
+        return request_id
+
+    def stop(self):
+        """Finish the queued requests, then end the thread."""
+        self.requests.put(STOP)
+        self.wait()
+
+    def run(self):
+        store, store_error = self.create_store()
+        backlog = collections.deque()
+        while True:
+            request = backlog.popleft() if backlog else self.requests.get()
+            if request is STOP:
+                break
+            if store is None:
+                self.fail(request, store_error)
+                continue
+            if not request[1]:
+                self.emit_outcome(self.execute(store, request))
+                continue
+
+            # Take every write queued right behind this one into the same transaction
+            batch = [request]
+            while True:
+                try:
+                    queued = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is STOP or not queued[1]:
+                    backlog.append(queued)
+                    break
+                batch.append(queued)
+            try:
+                with store.conn:
+                    outcomes = [self.execute(store, request) for request in batch]
+            except Exception as e:  # The commit failed, e.g. the database stayed locked
+                for request in batch:
+                    self.fail(request, f"not saved: {e}")
+                if store.conn is not None and store.conn.in_transaction:
+                    store.conn.rollback()
+                storage.close_all()
+                store, store_error = self.create_store()  # Its in-memory state may include the lost writes
+                continue
+            for outcome in outcomes:  # Only once committed, so readers see the changes
+                self.emit_outcome(outcome)
+        storage.close_all()
+
+    def create_store(self):
+        """(store, None), or (None, reason) if it cannot be created, e.g. the database cannot be opened."""
+        try:
+            return self.store_factory(), None
+        except Exception as e:
+            return None, f"cannot open the store: {e}"
+
+    def fail(self, request, reason):
+        request_id, is_write, method, args, kwargs = request
+        self.request_failed.emit(request_id, f"{method}: {reason}")
+
+    def execute(self, store, request):
+        request_id, is_write, method, args, kwargs = request
+        try:
+            return self.result_ready, request_id, getattr(store, method)(*args, **kwargs)
+        except Exception as e:
+            return self.request_failed, request_id, f"{method}: {e}"
+
+    def emit_outcome(self, outcome):
+        signal, request_id, value = outcome
+        signal.emit(request_id, value)
+
+    def deliver_result(self, request_id, result):
+        callback = self.callbacks.pop(request_id, None)
+        if callback is not None:
+            callback(result)
+
+    def report_failure(self, request_id, message):
+        self.callbacks.pop(request_id, None)
+        print(f"Error in database worker: {message}")